@@ -0,0 +1,140 @@
+# climatology.py
+# Day-of-year / hour-of-day climatology cube built from the station archive
+#
+# Build (batch job, e.g. nightly):
+#   python climatology.py weather_data.nc climatology.nc
+#
+# The cube holds mean and percentiles of hourly values for every
+# (day of year, local hour) pair, so the dashboard gets a 24-hour normal band
+# with one indexed lookup instead of scanning years of minute data.
+
+import argparse
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from units import UTC_OFFSET_HOURS
+
+CLIMATOLOGY_FILE = "climatology.nc"
+
+# variable: how minute data is reduced to hourly values
+CLIMATOLOGY_VARIABLES = {
+    "air_temperature": "mean",
+    "wind_avg": "mean",
+    "wind_gust": "max",
+    "rain_accumulated": "sum",
+}
+
+PERCENTILES = [10, 50, 90]
+STATS = ["mean"] + [f"p{p}" for p in PERCENTILES]
+
+# Days on each side pooled into every day of year, smooths short archives
+POOL_DAYS = 7
+
+
+# -----------------------------
+# BUILD
+# -----------------------------
+def hourly_values(nc_file, variables=CLIMATOLOGY_VARIABLES):
+    """Reduce the minute archive to hourly values in local time."""
+    with xr.open_dataset(nc_file, decode_timedelta=True) as ds:
+        names = [v for v in variables if v in ds.data_vars]
+        df = ds[names].to_dataframe()
+
+    df.index = pd.to_datetime(df.index) + pd.Timedelta(hours=UTC_OFFSET_HOURS)
+    df = df.apply(pd.to_numeric, errors="coerce")
+    hourly = df.resample("1h").agg({v: variables[v] for v in names})
+
+    # Hours without a single observation are missing, not zero rain
+    counts = df.resample("1h").count()
+    return hourly.where(counts > 0)
+
+
+def build_climatology(nc_file, pool_days=POOL_DAYS, variables=CLIMATOLOGY_VARIABLES):
+    """Return the (doy, hour, stat) climatology cube as an xarray Dataset."""
+    hourly = hourly_values(nc_file, variables)
+    doy = hourly.index.dayofyear.to_numpy()
+    hour = hourly.index.hour.to_numpy()
+
+    # Pool neighbouring days by replicating every hour at shifted day numbers
+    shifts = np.arange(-pool_days, pool_days + 1)
+    pooled_doy = ((doy[None, :] - 1 + shifts[:, None]) % 366 + 1).ravel()
+    pooled_hour = np.tile(hour, len(shifts))
+
+    out = {}
+    for var in hourly.columns:
+        values = np.tile(hourly[var].to_numpy(dtype="float64"), len(shifts))
+        frame = pd.DataFrame({"doy": pooled_doy, "hour": pooled_hour, "v": values}).dropna()
+        grouped = frame.groupby(["doy", "hour"])["v"]
+
+        table = pd.concat(
+            [grouped.mean().rename("mean")]
+            + [grouped.quantile(p / 100).rename(f"p{p}") for p in PERCENTILES],
+            axis=1,
+        )
+        full = pd.MultiIndex.from_product([range(1, 367), range(24)], names=["doy", "hour"])
+        cube = table.reindex(full)[STATS].to_numpy(dtype="float32").reshape(366, 24, len(STATS))
+        out[var] = (("doy", "hour", "stat"), cube)
+
+    return xr.Dataset(
+        out,
+        coords={"doy": np.arange(1, 367), "hour": np.arange(24), "stat": STATS},
+        attrs={
+            "source": str(nc_file),
+            "pool_days": pool_days,
+            "utc_offset_hours": UTC_OFFSET_HOURS,
+            "start": str(hourly.index.min()),
+            "end": str(hourly.index.max()),
+        },
+    )
+
+
+def save_climatology(clim, path=CLIMATOLOGY_FILE):
+    encoding = {v: {"zlib": True, "complevel": 4} for v in clim.data_vars}
+    clim.to_netcdf(path, encoding=encoding)
+
+
+# -----------------------------
+# LOOKUP
+# -----------------------------
+def load_climatology(path=CLIMATOLOGY_FILE):
+    with xr.open_dataset(path) as ds:
+        return ds.load()
+
+
+def normal_band(clim, start, hours=24):
+    """Normals for `hours` consecutive local hours starting at `start`.
+
+    Returns a DataFrame indexed by "Hora" with one "<var>_<stat>" column per
+    variable and statistic.
+    """
+    hora = pd.date_range(pd.Timestamp(start).floor("h"), periods=hours, freq="h")
+    doy = xr.DataArray(hora.dayofyear.to_numpy(), dims="Hora")
+    hour = xr.DataArray(hora.hour.to_numpy(), dims="Hora")
+
+    band = clim.sel(doy=doy, hour=hour)
+    df = pd.DataFrame(index=pd.Index(hora, name="Hora"))
+    for var in band.data_vars:
+        for stat in STATS:
+            df[f"{var}_{stat}"] = band[var].sel(stat=stat).to_numpy()
+    return df
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Build the station climatology cube.")
+    parser.add_argument("nc_file", help="station archive (NetCDF)")
+    parser.add_argument("out_file", nargs="?", default=CLIMATOLOGY_FILE)
+    parser.add_argument("--pool-days", type=int, default=POOL_DAYS)
+    args = parser.parse_args()
+
+    clim = build_climatology(args.nc_file, pool_days=args.pool_days)
+    save_climatology(clim, args.out_file)
+    print(f"Wrote {args.out_file} ({clim.attrs['start']} – {clim.attrs['end']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+# export.py
+# Streaming CSV / Parquet / NetCDF exports of the station archive
+#
+# Subsets are read from the NetCDF file CHUNK_ROWS time steps at a time and
+# written out as they are read, so memory stays flat however long the range.
+#
+#   python export.py weather_data.nc out.parquet --start 2026-01-01 --end 2026-03-01 \
+#       --variables air_temperature wind_avg --units
+
+import argparse
+import io
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from units import DISPLAY_UNITS, to_display
+
+CHUNK_ROWS = 50_000
+BLOCK_SIZE = 1 << 20
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+    "netcdf": ("application/x-netcdf", ".nc"),
+}
+
+
+# -----------------------------
+# READING
+# -----------------------------
+def export_variables(nc_file):
+    """Variables that can be exported (those along the time dimension)."""
+    with xr.open_dataset(nc_file, decode_timedelta=True) as ds:
+        return [v for v in ds.data_vars if "time" in ds[v].dims]
+
+
+def iter_chunks(nc_file, start=None, end=None, variables=None,
+                convert_units=False, chunk_rows=CHUNK_ROWS):
+    """Yield DataFrames ("time" + variables) covering [start, end] in UTC."""
+    with xr.open_dataset(nc_file, decode_timedelta=True) as ds:
+        if variables is None:
+            variables = [v for v in ds.data_vars if "time" in ds[v].dims]
+        missing = set(variables) - set(ds.data_vars)
+        if missing:
+            raise ValueError(f"Unknown variables: {', '.join(sorted(missing))}")
+
+        # Archive is sorted by time, so the range is a contiguous index slice
+        index = ds.indexes["time"]
+        i0 = 0 if start is None else index.searchsorted(pd.Timestamp(start), side="left")
+        i1 = len(index) if end is None else index.searchsorted(pd.Timestamp(end), side="right")
+
+        # An empty range still yields one empty chunk, so writers emit the header/schema
+        for lo in range(i0, i1, chunk_rows) or [i0]:
+            chunk = ds[variables].isel(time=slice(lo, min(lo + chunk_rows, i1))).load()
+            df = chunk.to_dataframe().reset_index()[["time"] + list(variables)]
+            if convert_units:
+                for var in variables:
+                    if var in DISPLAY_UNITS:
+                        df[var] = to_display(df[var], var)
+            yield df
+
+
+# Encoding attributes that don't describe the decoded float values we write
+PACKING_ATTRS = {"_FillValue", "missing_value", "scale_factor", "add_offset", "valid_range"}
+
+
+def column_attrs(nc_file, variables, convert_units):
+    """Source attributes of each variable, with "units" set to the exported unit."""
+    attrs = {}
+    with xr.open_dataset(nc_file, decode_timedelta=True) as ds:
+        for var in variables:
+            a = {k: v for k, v in ds[var].attrs.items() if k not in PACKING_ATTRS}
+            if convert_units and var in DISPLAY_UNITS:
+                a["units"] = DISPLAY_UNITS[var][2]
+            attrs[var] = a
+    return attrs
+
+
+# -----------------------------
+# WRITERS
+# -----------------------------
+def stream_csv(chunks):
+    header = True
+    for df in chunks:
+        yield df.to_csv(index=False, header=header, date_format="%Y-%m-%dT%H:%M:%SZ").encode()
+        header = False
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the caller.
+
+    Tracks the absolute position so the Parquet footer offsets stay valid
+    even though earlier bytes have already been sent.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.parts.append(bytes(b))
+        self.pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.pos
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_parquet(chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    for df in chunks:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema, compression="zstd")
+        writer.write_table(table)  # one row group per chunk
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def write_netcdf(chunks, path, attrs=None):
+    """Append chunks to a NetCDF file along an unlimited time dimension."""
+    import netCDF4
+
+    attrs = attrs or {}
+    with netCDF4.Dataset(path, "w") as nc:
+        nc.createDimension("time", None)
+        t = nc.createVariable("time", "i8", ("time",))
+        t.units = "seconds since 1970-01-01 00:00:00"
+        t.calendar = "standard"
+        n = 0
+        for df in chunks:
+            if n == 0:
+                for var in df.columns.drop("time"):
+                    v = nc.createVariable(var, "f4", ("time",), zlib=True, fill_value=np.nan)
+                    v.setncatts(attrs.get(var, {}))
+            rows = len(df)
+            t[n:n + rows] = df["time"].values.astype("datetime64[s]").astype("int64")
+            for var in df.columns.drop("time"):
+                nc[var][n:n + rows] = df[var].to_numpy(dtype="float32")
+            n += rows
+
+
+def stream_netcdf(chunks, attrs=None):
+    # NetCDF needs seekable output, so spool through a temporary file
+    fd, path = tempfile.mkstemp(suffix=".nc")
+    os.close(fd)
+    try:
+        write_netcdf(chunks, path, attrs)
+        with open(path, "rb") as f:
+            while block := f.read(BLOCK_SIZE):
+                yield block
+    finally:
+        os.remove(path)
+
+
+# -----------------------------
+# API
+# -----------------------------
+def stream_export(nc_file, fmt, start=None, end=None, variables=None,
+                  convert_units=False, chunk_rows=CHUNK_ROWS):
+    """Yield the encoded bytes of a subset export in `fmt`."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if variables is None:
+        variables = export_variables(nc_file)
+    chunks = iter_chunks(nc_file, start, end, variables, convert_units, chunk_rows)
+
+    if fmt == "csv":
+        return stream_csv(chunks)
+    if fmt == "parquet":
+        return stream_parquet(chunks)
+    return stream_netcdf(chunks, column_attrs(nc_file, variables, convert_units))
+
+
+def export_to_file(path, nc_file, fmt, **kwargs):
+    """Write an export to `path`, returning the number of bytes written."""
+    size = 0
+    with open(path, "wb") as f:
+        for block in stream_export(nc_file, fmt, **kwargs):
+            f.write(block)
+            size += len(block)
+    return size
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Export a subset of the station archive.")
+    parser.add_argument("nc_file", help="station archive (NetCDF)")
+    parser.add_argument("out_file")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default=None,
+                        help="defaults to the output file extension")
+    parser.add_argument("--start", help="UTC start time (inclusive)")
+    parser.add_argument("--end", help="UTC end time (inclusive)")
+    parser.add_argument("--variables", nargs="+")
+    parser.add_argument("--units", action="store_true", help="apply dashboard unit conversions")
+    args = parser.parse_args()
+
+    fmt = args.format
+    if fmt is None:
+        ext = os.path.splitext(args.out_file)[1]
+        fmt = next((k for k, (_, e) in EXPORT_FORMATS.items() if e == ext), "csv")
+
+    size = export_to_file(args.out_file, args.nc_file, fmt, start=args.start, end=args.end,
+                          variables=args.variables, convert_units=args.units)
+    print(f"Wrote {args.out_file} ({size / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
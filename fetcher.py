@@ -0,0 +1,244 @@
+# fetcher.py
+# Background downloads of new radar frames and station data into the local caches
+#
+# One aiohttp session (pooled keep-alive connections) is shared by all
+# requests; a semaphore caps concurrency, every request is conditional
+# (ETag / If-Modified-Since) and failures are retried with exponential backoff.
+# Client errors (4xx other than 429) are not retried. Only the newest
+# KEEP_FRAMES radar frames are kept on disk.
+# Files are written to a temporary name and renamed, so the dashboard never
+# reads a partial download.
+#
+# Sources are configured with environment variables:
+#   RADAR_INDEX_URL   directory listing that links the BREF GeoTIFFs
+#   STATION_DATA_URL  station NetCDF file
+#
+# Any static HTTP server works as a local stub, e.g.
+#   python -m http.server 8000 --directory /path/to/mirror
+#   RADAR_INDEX_URL=http://localhost:8000/radar_images/ python fetcher.py --once
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+from urllib.parse import urljoin
+
+import aiohttp
+
+from radar import RADAR_DIR, RADAR_PATTERN
+
+RADAR_INDEX_URL = os.environ.get("RADAR_INDEX_URL", "")
+STATION_DATA_URL = os.environ.get("STATION_DATA_URL", "")
+DATA_FILE = "weather_data.nc"
+VALIDATORS_FILE = ".fetch_validators.json"
+
+MAX_CONCURRENCY = 4
+MAX_RETRIES = 4
+BACKOFF_S = 1.0
+TIMEOUT_S = 30
+POLL_S = 60
+KEEP_FRAMES = 96         # a few hours of frames; the radar loop needs 32
+
+FRAME_LINK = re.compile(r'href="([^"]*CARIB_L2_BREF_QCD_\d{8}_\d{6}\.tif)"')
+
+
+class FetchError(Exception):
+    pass
+
+
+class FetchFatalError(FetchError):
+    """Request failed in a way a retry won't fix (e.g. 404)."""
+
+
+class AsyncFetcher:
+    """Conditional, retried, concurrency-limited HTTP downloads."""
+
+    def __init__(self, validators_file=VALIDATORS_FILE, max_concurrency=MAX_CONCURRENCY,
+                 max_retries=MAX_RETRIES, backoff_s=BACKOFF_S, timeout_s=TIMEOUT_S):
+        self.validators_file = validators_file
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.timeout_s = timeout_s
+        self.validators = self._load_validators()
+        self.session = None
+        self.semaphore = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout_s),
+        )
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+        self.save_validators()
+
+    # -----------------------------
+    # VALIDATORS (ETag / Last-Modified)
+    # -----------------------------
+    def _load_validators(self):
+        try:
+            with open(self.validators_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_validators(self):
+        tmp = self.validators_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.validators, f)
+        os.replace(tmp, self.validators_file)
+
+    def _conditional_headers(self, url, dest):
+        headers = {}
+        cached = self.validators.get(url, {})
+        if dest is None or os.path.exists(dest):
+            if "etag" in cached:
+                headers["If-None-Match"] = cached["etag"]
+            if "last_modified" in cached:
+                headers["If-Modified-Since"] = cached["last_modified"]
+        return headers
+
+    # -----------------------------
+    # REQUESTS
+    # -----------------------------
+    async def fetch(self, url, dest=None):
+        """GET `url`; returns the body (or writes it to `dest`) or None if unchanged."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.semaphore:
+                    return await self._fetch_once(url, dest)
+            except FetchFatalError as e:
+                raise FetchFatalError(f"{url}: {e}") from e
+            except (aiohttp.ClientError, asyncio.TimeoutError, FetchError) as e:
+                if attempt == self.max_retries:
+                    raise FetchError(f"{url}: {e}") from e
+                await asyncio.sleep(self.backoff_s * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    async def _fetch_once(self, url, dest):
+        headers = self._conditional_headers(url, dest)
+        async with self.session.get(url, headers=headers) as resp:
+            if resp.status == 304:
+                return None
+            if resp.status >= 500 or resp.status == 429:
+                raise FetchError(f"HTTP {resp.status}")
+            if resp.status >= 400:
+                raise FetchFatalError(f"HTTP {resp.status}")
+
+            if dest is None:
+                body = await resp.read()
+            else:
+                os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+                tmp = dest + ".part"
+                with open(tmp, "wb") as f:
+                    async for block in resp.content.iter_chunked(1 << 16):
+                        f.write(block)
+                os.replace(tmp, dest)
+                body = dest
+
+            validators = {}
+            if "ETag" in resp.headers:
+                validators["etag"] = resp.headers["ETag"]
+            if "Last-Modified" in resp.headers:
+                validators["last_modified"] = resp.headers["Last-Modified"]
+            if validators:
+                self.validators[url] = validators
+            return body
+
+
+# -----------------------------
+# SYNC JOBS
+# -----------------------------
+def prune_frames(radar_dir=RADAR_DIR, keep=KEEP_FRAMES):
+    """Delete all but the newest `keep` frames; returns the removed names."""
+    try:
+        names = [n for n in os.listdir(radar_dir) if RADAR_PATTERN.search(n)]
+    except FileNotFoundError:
+        return []
+    names.sort(key=lambda n: RADAR_PATTERN.search(n).groups())
+    old = names[:-keep]
+    for n in old:
+        os.remove(os.path.join(radar_dir, n))
+    return old
+
+
+async def sync_radar(fetcher, index_url=RADAR_INDEX_URL, radar_dir=RADAR_DIR, keep=KEEP_FRAMES):
+    """Download frames listed at `index_url` that are not in `radar_dir` yet."""
+    listing = await fetcher.fetch(index_url)
+    if listing is None:
+        return []
+    names = {os.path.basename(href) for href in FRAME_LINK.findall(listing.decode(errors="replace"))}
+    names = sorted((n for n in names if RADAR_PATTERN.search(n)),
+                   key=lambda n: RADAR_PATTERN.search(n).groups())[-keep:]
+    missing = [n for n in names if not os.path.exists(os.path.join(radar_dir, n))]
+    try:
+        await asyncio.gather(*(
+            fetcher.fetch(urljoin(index_url, n), os.path.join(radar_dir, n)) for n in missing
+        ))
+    finally:
+        prune_frames(radar_dir, keep)
+    return missing
+
+
+async def sync_station(fetcher, url=STATION_DATA_URL, dest=DATA_FILE):
+    """Refresh the station NetCDF if it changed upstream."""
+    return await fetcher.fetch(url, dest) is not None
+
+
+async def sync_all(fetcher, radar_index_url=RADAR_INDEX_URL, station_url=STATION_DATA_URL):
+    jobs = []
+    if radar_index_url:
+        jobs.append(sync_radar(fetcher, radar_index_url))
+    if station_url:
+        jobs.append(sync_station(fetcher, station_url))
+    results = await asyncio.gather(*jobs, return_exceptions=True)
+    fetcher.save_validators()
+    return results
+
+
+async def sync_once(**kwargs):
+    async with AsyncFetcher() as fetcher:
+        return await sync_all(fetcher, **kwargs)
+
+
+async def sync_forever(poll_s=POLL_S, **kwargs):
+    # One session for the lifetime of the loop keeps connections warm
+    async with AsyncFetcher() as fetcher:
+        while True:
+            await sync_all(fetcher, **kwargs)
+            await asyncio.sleep(poll_s)
+
+
+def start_background(poll_s=POLL_S, **kwargs):
+    """Run sync_forever on its own event loop in a daemon thread."""
+    thread = threading.Thread(
+        target=lambda: asyncio.run(sync_forever(poll_s, **kwargs)),
+        name="fetcher",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch new radar frames and station data.")
+    parser.add_argument("--once", action="store_true", help="sync once and exit")
+    parser.add_argument("--poll", type=float, default=POLL_S, help="seconds between syncs")
+    args = parser.parse_args()
+
+    if args.once:
+        for result in asyncio.run(sync_once()):
+            print(result)
+    else:
+        asyncio.run(sync_forever(args.poll))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# lightning_alerts.py
+# Background lightning alerting for the beach
+#
+# A LightningMonitor thread evaluates every new observation as soon as it is
+# either submitted by the ingestion process (monitor.submit(obs)) or found in
+# the NetCDF archive by polling its modification time. Alerts are kept for the
+# dashboard banner and POSTed to a local webhook by a separate sender thread,
+# so a slow endpoint never delays evaluation and no viewer rerun is needed.
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+import pandas as pd
+import requests
+import xarray as xr
+
+log = logging.getLogger(__name__)
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+@dataclass
+class AlertConfig:
+    radius_km: float = 10.0          # strikes closer than this raise an alert (~6 mi)
+    count_window_min: int = 10       # window for the rising strike count test
+    count_threshold: int = 3         # strikes in the window that count as "rising"
+    clear_min: int = 30              # minutes without nearby strikes before all clear
+    poll_s: float = 5.0              # archive polling interval
+    webhook_url: str = field(default_factory=lambda: os.environ.get("LIGHTNING_WEBHOOK_URL", ""))
+    webhook_timeout_s: float = 3.0
+    webhook_attempts: int = 3        # posts per alert before it is dropped
+
+
+@dataclass
+class Alert:
+    kind: str          # "proximity", "rising" or "all_clear"
+    time: str          # observation time (UTC, ISO 8601)
+    distance_km: float
+    strikes: int
+    message: str
+
+
+# -----------------------------
+# EVALUATION
+# -----------------------------
+class LightningEvaluator:
+    """Stateful per-observation alert rules; O(1) amortized per observation."""
+
+    def __init__(self, config=None):
+        self.config = config or AlertConfig()
+        self.recent = deque()      # (epoch s, strikes) within the count window
+        self.recent_total = 0
+        self.prev_total = 0
+        self.last_strike = None    # epoch s of the last strike at any distance
+        self.active = None         # Alert currently shown, or None
+
+    def evaluate(self, t, distance_km, strikes=None):
+        """Evaluate one observation and return the list of new alerts."""
+        cfg = self.config
+        if strikes is None or np.isnan(strikes):
+            # Without a count, a nonzero distance means a strike was detected
+            strikes = 1 if distance_km and distance_km > 0 else 0
+        strikes = int(strikes)
+        stamp = pd.Timestamp(t, unit="s", tz="UTC").isoformat()
+        alerts = []
+
+        self.recent.append((t, strikes))
+        self.recent_total += strikes
+        cutoff = t - cfg.count_window_min * 60
+        while self.recent and self.recent[0][0] <= cutoff:
+            self.recent_total -= self.recent.popleft()[1]
+
+        if strikes > 0:
+            self.last_strike = t
+        near = strikes > 0 and distance_km is not None and 0 < distance_km <= cfg.radius_km
+        if near and (self.active is None or self.active.kind != "proximity"):
+            alerts.append(Alert(
+                "proximity", stamp, float(distance_km), strikes,
+                f"Rayo a {distance_km:.1f} km de la estación",
+            ))
+
+        if self.recent_total >= cfg.count_threshold and self.recent_total > self.prev_total \
+                and (self.active is None or self.active.kind == "all_clear"):
+            alerts.append(Alert(
+                "rising", stamp, float(distance_km or np.nan), self.recent_total,
+                f"{self.recent_total} rayos en los últimos {cfg.count_window_min} min",
+            ))
+        self.prev_total = self.recent_total
+
+        if self.active is not None and self.active.kind != "all_clear" and not alerts:
+            # Every alert is triggered by a strike, so last_strike is set here
+            if t - self.last_strike >= cfg.clear_min * 60:
+                alerts.append(Alert(
+                    "all_clear", stamp, float("nan"), 0,
+                    f"Sin rayos en {cfg.clear_min} min",
+                ))
+
+        if alerts:
+            self.active = alerts[-1] if alerts[-1].kind == "all_clear" else alerts[0]
+        return alerts
+
+
+# -----------------------------
+# MONITOR
+# -----------------------------
+class LightningMonitor(threading.Thread):
+    """Daemon thread that feeds new observations to a LightningEvaluator."""
+
+    def __init__(self, nc_file, config=None, state_file="lightning_alert.json"):
+        super().__init__(name="lightning-monitor", daemon=True)
+        self.nc_file = nc_file
+        self.config = config or AlertConfig()
+        self.state_file = state_file
+        self.evaluator = LightningEvaluator(self.config)
+        self.inbox = queue.Queue()
+        self.outbox = queue.Queue()
+        self.lock = threading.Lock()
+        self.history = deque(maxlen=50)
+        self.last_time = None
+        self.last_mtime = None
+        self.last_error = None
+        self.heartbeat = None      # monotonic time of the last completed iteration
+        self._stop_event = threading.Event()
+        self._sender = threading.Thread(target=self._send_webhooks, name="lightning-webhook", daemon=True)
+
+    # Public API ------------------------------------------------------------
+    def submit(self, t, distance_km, strikes=None):
+        """Push an observation directly from the ingestion path."""
+        self.inbox.put((t, distance_km, strikes))
+
+    def active_alert(self):
+        with self.lock:
+            return self.evaluator.active
+
+    def healthy(self):
+        """True while the thread runs and its last iteration finished recently without error."""
+        if not self.is_alive() or self.last_error is not None:
+            return False
+        if self.heartbeat is None:  # started, first iteration still pending
+            return True
+        return time.monotonic() - self.heartbeat < 3 * self.config.poll_s + 10
+
+    def stop(self):
+        self._stop_event.set()
+        self.inbox.put(None)
+        self.outbox.put(None)   # ends the webhook sender
+
+    # Thread ----------------------------------------------------------------
+    def run(self):
+        self._sender.start()
+        self.heartbeat = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                item = self.inbox.get(timeout=self.config.poll_s)
+            except queue.Empty:
+                item = None
+            try:
+                if item is not None:
+                    self._process([item])
+                else:
+                    self._process(self._poll_archive())
+                self.last_error = None
+            except Exception as e:
+                # A bad read must not kill the monitor; keep looping and report it
+                log.exception("Lightning monitor iteration failed")
+                self.last_error = f"{type(e).__name__}: {e}"
+            self.heartbeat = time.monotonic()
+
+    def _process(self, observations):
+        for t, distance_km, strikes in observations:
+            if self.last_time is not None and t <= self.last_time:
+                continue
+            self.last_time = t
+            with self.lock:
+                alerts = self.evaluator.evaluate(t, distance_km, strikes)
+                self.history.extend(alerts)
+            for alert in alerts:
+                self.outbox.put(alert)
+            if alerts:
+                self._save_state()
+
+    def _poll_archive(self):
+        """New observations appended to the archive since the last poll."""
+        try:
+            mtime = os.path.getmtime(self.nc_file)
+        except OSError:
+            return []
+        if mtime == self.last_mtime:
+            return []
+
+        with xr.open_dataset(self.nc_file, decode_timedelta=True) as ds:
+            times = ds.indexes["time"]
+            if self.last_time is not None:
+                start = times.searchsorted(pd.Timestamp(self.last_time, unit="s"), side="right")
+            elif len(times):
+                # On startup only the span that can still hold an active alert matters
+                start = times.searchsorted(times[-1] - pd.Timedelta(minutes=self.config.clear_min))
+            else:
+                start = 0
+            tail = ds.isel(time=slice(start, None))
+            t = tail["time"].values.astype("datetime64[s]").astype("int64")
+            dist = tail["lightning_strike_avg_distance"].values.astype("float64")
+            if "lightning_strike_count" in tail:
+                count = tail["lightning_strike_count"].values.astype("float64")
+            else:
+                count = np.full(len(t), np.nan)
+        # Only after a successful read, so a failed one is retried next poll
+        self.last_mtime = mtime
+        return list(zip(t.tolist(), dist.tolist(), count.tolist()))
+
+    def _save_state(self):
+        state = {
+            "active": asdict(self.evaluator.active) if self.evaluator.active else None,
+            "history": [asdict(a) for a in self.history],
+        }
+        tmp = self.state_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_file)
+
+    def _send_webhooks(self):
+        session = requests.Session()
+        attempts = self.config.webhook_attempts
+        while True:
+            alert = self.outbox.get()
+            if alert is None:
+                break
+            if not self.config.webhook_url:
+                continue
+            payload = asdict(alert)
+            for attempt in range(attempts):
+                try:
+                    session.post(self.config.webhook_url, json=payload,
+                                 timeout=self.config.webhook_timeout_s).raise_for_status()
+                    break
+                except requests.RequestException as e:
+                    if attempt == attempts - 1:
+                        log.warning("Dropping %s lightning alert after %d failed webhook posts: %s",
+                                    alert.kind, attempts, e)
+                    else:
+                        time.sleep(2 ** attempt)
+        session.close()
@@ -0,0 +1,315 @@
+# loadtest.py
+# Load test: N concurrent simulated viewers of one dashboard server
+#
+# Starts `streamlit run` on the dashboard in a scratch directory holding
+# synthetic station data and the radar frames, then drives it with N
+# websocket clients speaking Streamlit's browser protocol: each opens a
+# session, asks for a script run and times it until the server reports the
+# run finished, then reruns. Sessions share the server's caches, as real
+# viewers do, so only the very first run is a cold start. CPU and memory are
+# those of the server process, sampled from /proc.
+#
+#   python loadtest.py --sessions 20 --reruns 5 --days 30
+#   python loadtest.py --sessions 50 --json results.json --max-p95 2.0
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import aiohttp
+import numpy as np
+import pandas as pd
+import xarray as xr
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+from units import UTC_OFFSET_HOURS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = "weather_dashboard_public_shared.py"
+STARTUP_TIMEOUT_S = 120   # for the server to answer its health check
+ASSETS = [
+    "logo.png", "logo_toabaja.png", "logo_egsp.png", "logoupr.png",
+    "logocienciasmedicas.png", "logovela.png", "logocaricoos.png",
+]
+
+
+# -----------------------------
+# SYNTHETIC DATA
+# -----------------------------
+def synthetic_station(path, days=7, seed=0):
+    """Minute observations with a diurnal cycle, gusty wind and rain showers."""
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp.now(tz="UTC").floor("min").tz_localize(None)
+    time_index = pd.date_range(end=end, periods=days * 24 * 60, freq="min")
+    n = len(time_index)
+    hour = (time_index.hour.to_numpy() + UTC_OFFSET_HOURS) % 24
+    diurnal = np.sin((hour - 9) / 24 * 2 * np.pi)
+
+    wind = np.clip(4 + 2 * diurnal + rng.normal(0, 0.8, n), 0, None)
+    showers = rng.random(n) < 0.01
+    ds = xr.Dataset(
+        {
+            "air_temperature": ("time", 27 + 3 * diurnal + rng.normal(0, 0.2, n)),
+            "relative_humidity": ("time", np.clip(75 - 10 * diurnal + rng.normal(0, 2, n), 0, 100)),
+            "wind_avg": ("time", wind),
+            "wind_gust": ("time", wind * 1.4),
+            "wind_lull": ("time", wind * 0.6),
+            "wind_direction": ("time", (90 + rng.normal(0, 20, n)) % 360),
+            "rain_accumulated": ("time", np.where(showers, rng.exponential(0.3, n), 0.0)),
+            "uv": ("time", np.clip(11 * diurnal, 0, None).round(1)),
+            "lightning_strike_avg_distance": ("time", np.where(rng.random(n) < 0.002, rng.uniform(2, 30, n), 0.0)),
+        },
+        coords={"time": time_index},
+    )
+    ds.to_netcdf(path)
+
+
+def prepare_workdir(days, radar_dir=None):
+    """Scratch directory with the logos, config, synthetic data and optional radar frames."""
+    workdir = tempfile.mkdtemp(prefix="ccan_loadtest_")
+    for name in ASSETS + [SCRIPT, ".streamlit"]:
+        if os.path.exists(os.path.join(HERE, name)):
+            os.symlink(os.path.join(HERE, name), os.path.join(workdir, name))
+    for name in os.listdir(HERE):
+        if name.endswith(".py") and not os.path.exists(os.path.join(workdir, name)):
+            os.symlink(os.path.join(HERE, name), os.path.join(workdir, name))
+    os.makedirs(os.path.join(workdir, "radar_images"))
+    if radar_dir:
+        for name in os.listdir(radar_dir):
+            os.symlink(os.path.abspath(os.path.join(radar_dir, name)),
+                       os.path.join(workdir, "radar_images", name))
+    synthetic_station(os.path.join(workdir, "weather_data.nc"), days)
+    return workdir
+
+
+# -----------------------------
+# SERVER
+# -----------------------------
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir, port, log_file):
+    """`streamlit run` on the dashboard in `workdir`; returns the Popen."""
+    cmd = [
+        sys.executable, "-m", "streamlit", "run", SCRIPT,
+        "--server.headless", "true", "--server.port", str(port),
+        "--server.address", "127.0.0.1", "--browser.gatherUsageStats", "false",
+    ]
+    return subprocess.Popen(cmd, cwd=workdir, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+async def wait_healthy(base_url, server, timeout_s=STARTUP_TIMEOUT_S):
+    deadline = time.monotonic() + timeout_s
+    async with aiohttp.ClientSession() as http:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"Streamlit exited with code {server.returncode}")
+            try:
+                async with http.get(f"{base_url}/_stcore/health") as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"Streamlit did not become healthy within {timeout_s:.0f} s")
+
+
+class ProcessSampler(threading.Thread):
+    """Samples CPU time and RSS of one process from /proc until stopped."""
+
+    def __init__(self, pid, interval_s=0.25):
+        super().__init__(name="loadtest-sampler", daemon=True)
+        self.pid = pid
+        self.interval_s = interval_s
+        self.peak_rss_mb = 0.0
+        self._stop_event = threading.Event()
+
+    def cpu_s(self):
+        """User + system CPU seconds of the process so far (NaN without /proc)."""
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, IndexError, ValueError):
+            return float("nan")
+
+    def rss_mb(self):
+        try:
+            with open(f"/proc/{self.pid}/statm") as f:
+                pages = int(f.read().split()[1])
+            return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+        except (OSError, IndexError, ValueError):
+            return float("nan")
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_s):
+            self.peak_rss_mb = max(self.peak_rss_mb, self.rss_mb())
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak_rss_mb = max(self.peak_rss_mb, self.rss_mb())
+
+
+# -----------------------------
+# SESSIONS
+# -----------------------------
+def rerun_message():
+    msg = BackMsg()
+    msg.rerun_script.query_string = ""
+    return msg.SerializeToString()
+
+
+async def script_run(ws):
+    """Request one run; returns the number of exceptions it rendered."""
+    await ws.send_bytes(rerun_message())
+    errors = 0
+    async for frame in ws:
+        if frame.type != aiohttp.WSMsgType.BINARY:
+            break
+        msg = ForwardMsg()
+        msg.ParseFromString(frame.data)
+        kind = msg.WhichOneof("type")
+        if kind == "delta" and msg.delta.WhichOneof("type") == "new_element" \
+                and msg.delta.new_element.WhichOneof("type") == "exception":
+            errors += 1
+        elif kind == "script_finished":
+            if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                errors += 1
+            return errors
+    raise ConnectionError("Websocket closed before the script finished")
+
+
+async def run_session(http, stream_url, reruns, think_s, timeout_s):
+    """One viewer: first load plus `reruns` reruns on one websocket.
+
+    Returns (latencies, errors); a failed run ends the session.
+    """
+    latencies, errors = [], 0
+    try:
+        async with http.ws_connect(stream_url, protocols=["streamlit"], max_msg_size=0) as ws:
+            for i in range(reruns + 1):
+                start = time.perf_counter()
+                errors += await asyncio.wait_for(script_run(ws), timeout_s)
+                latencies.append(time.perf_counter() - start)
+                if think_s and i < reruns:
+                    await asyncio.sleep(think_s)
+    except (aiohttp.ClientError, ConnectionError, asyncio.TimeoutError):
+        errors += reruns + 1 - len(latencies)
+    return latencies, errors
+
+
+async def drive(base_url, server, sessions, reruns, think_s, timeout_s):
+    await wait_healthy(base_url, server)
+    sampler = ProcessSampler(server.pid)
+    rss_idle = sampler.rss_mb()
+    sampler.start()
+    cpu_start, start = sampler.cpu_s(), time.perf_counter()
+    stream_url = f"{base_url}/_stcore/stream"
+    async with aiohttp.ClientSession() as http:
+        results = await asyncio.gather(*[
+            run_session(http, stream_url, reruns, think_s, timeout_s) for _ in range(sessions)
+        ])
+    wall = time.perf_counter() - start
+    cpu_s = sampler.cpu_s() - cpu_start
+    sampler.stop()
+    return results, wall, cpu_s, rss_idle, sampler.peak_rss_mb
+
+
+def run_load(workdir, sessions, reruns, think_s=0.0, timeout_s=120):
+    port = free_port()
+    with open(os.path.join(workdir, "streamlit.log"), "wb") as log_file:
+        server = start_server(workdir, port, log_file)
+        try:
+            results, wall, cpu_s, rss_idle, rss_peak = asyncio.run(
+                drive(f"http://127.0.0.1:{port}", server, sessions, reruns, think_s, timeout_s))
+        finally:
+            server.terminate()
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    first = np.array([r[0][0] for r in results if r[0]])
+    rest = np.array([x for r in results for x in r[0][1:]])
+    all_runs = np.concatenate([first, rest])
+
+    def pct(a):
+        if len(a) == 0:
+            return {}
+        return {f"p{p}": float(np.percentile(a, p)) for p in (50, 90, 95, 99)} | {"max": float(a.max())}
+
+    return {
+        "sessions": sessions,
+        "reruns_per_session": reruns,
+        "runs": int(len(all_runs)),
+        "errors": int(sum(r[1] for r in results)),
+        "wall_s": wall,
+        "runs_per_s": len(all_runs) / wall,
+        "latency_s": pct(all_runs),
+        "first_load_s": pct(first),
+        "rerun_s": pct(rest),
+        "cpu_s": cpu_s,
+        "cpu_pct": 100 * cpu_s / wall,   # server process, can exceed 100 on several cores
+        "rss_mb": {"idle": rss_idle, "peak": rss_peak},
+    }
+
+
+def print_report(report):
+    print(f"{report['sessions']} sessions x {report['reruns_per_session'] + 1} runs "
+          f"= {report['runs']} runs in {report['wall_s']:.1f} s ({report['runs_per_s']:.1f} runs/s), "
+          f"{report['errors']} errors")
+    for key, label in (("first_load_s", "first load"), ("rerun_s", "rerun"), ("latency_s", "all")):
+        stats = report[key]
+        if stats:
+            print(f"  {label:<10} " + "  ".join(f"{k} {v * 1000:7.0f} ms" for k, v in stats.items()))
+    print(f"  cpu        server {report['cpu_s']:.1f} s, {report['cpu_pct']:.0f}% of one core")
+    rss = report["rss_mb"]
+    print(f"  rss        server idle {rss['idle']:.0f} MB  peak {rss['peak']:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test one dashboard server with concurrent viewers.")
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent simulated viewers")
+    parser.add_argument("--reruns", type=int, default=3, help="reruns per viewer after the first load")
+    parser.add_argument("--think", type=float, default=0.0, help="seconds between a viewer's reruns")
+    parser.add_argument("--days", type=int, default=7, help="days of synthetic minute data")
+    parser.add_argument("--radar-dir", default=os.path.join(HERE, "radar_images"),
+                        help="radar frames to use ('' for none; default: the repo's radar_images)")
+    parser.add_argument("--timeout", type=float, default=120, help="per-run timeout in seconds")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--max-p95", type=float, help="exit non-zero if the p95 latency (s) is above this")
+    args = parser.parse_args()
+
+    workdir = prepare_workdir(args.days, args.radar_dir)
+    try:
+        report = run_load(workdir, args.sessions, args.reruns, args.think, args.timeout)
+    except RuntimeError:
+        with open(os.path.join(workdir, "streamlit.log")) as f:
+            sys.stderr.write(f.read()[-4000:])
+        raise
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.max_p95 is not None and report["latency_s"].get("p95", 0) > args.max_p95:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# qc.py
+# Quality control of Tempest observations: range, spike and flat-line checks
+#
+# All checks are vectorized over whole columns (one numpy pass per check), so
+# they run on every ingested batch and can backfill the archive:
+#   python qc.py weather_data.nc
+# which stores a "<variable>_qc" flag variable next to each checked variable.
+#
+# Limits are in the archive (SI) units, i.e. before dashboard conversions.
+
+import argparse
+import os
+
+import numpy as np
+import xarray as xr
+
+# Bit flags, combined per observation
+QC_RANGE = 1    # outside the physical/sensor range
+QC_SPIKE = 2    # jumps away from both neighbours and back
+QC_FLAT = 4     # stuck sensor: same value repeated too long
+
+QC_SUFFIX = "_qc"
+
+# variable: check parameters
+#   range: (min, max) valid values
+#   spike: largest plausible change per minute
+#   flat:  consecutive identical observations before flagging
+#   flat_ok: values that may legitimately repeat (calm, no rain, night, ...)
+QC_RULES = {
+    "air_temperature": {"range": (-5, 45), "spike": 3.0, "flat": 120},
+    "relative_humidity": {"range": (0, 100), "spike": 20.0, "flat": 180, "flat_ok": (100,)},
+    "wind_avg": {"range": (0, 75), "spike": 20.0, "flat": 60, "flat_ok": (0,)},
+    "wind_gust": {"range": (0, 90), "spike": 30.0, "flat": 60, "flat_ok": (0,)},
+    "wind_lull": {"range": (0, 75), "spike": 20.0, "flat": 60, "flat_ok": (0,)},
+    "wind_direction": {"range": (0, 360), "flat": 120},
+    "rain_accumulated": {"range": (0, 10), "flat": 30, "flat_ok": (0,)},
+    "uv": {"range": (0, 16), "spike": 5.0, "flat": 60, "flat_ok": (0,)},
+    # No spike test: the sensor reports 0 between strikes, so a single real
+    # detection looks exactly like an out-and-back spike
+    "lightning_strike_avg_distance": {"range": (0, 40)},
+}
+
+# The spike test needs the following observation, so the newest row's flags
+# are provisional until the next one arrives. Anything that persists results
+# (e.g. running statistics) should hold back this many trailing rows.
+#
+# Flat-line flags are not covered: a stuck run is only flagged once it reaches
+# its "flat" length (up to 180 rows), and holding back that much would leave
+# the 1 h statistics hours behind. Rows already persisted before their run
+# was flagged keep their values; only later rows of the run are excluded.
+QC_PENDING_ROWS = 1
+
+
+# -----------------------------
+# CHECKS
+# -----------------------------
+def range_check(x, lo, hi):
+    return (x < lo) | (x > hi)
+
+
+def spike_check(x, minutes, max_rate):
+    """Flag points that jump away from both neighbours in opposite directions.
+
+    A single step change (e.g. a front passing) is not flagged, only the
+    out-and-back shape of a bad reading. The last point has no successor and
+    is never flagged here (see QC_PENDING_ROWS).
+    """
+    flags = np.zeros(len(x), dtype=bool)
+    if len(x) < 3:
+        return flags
+    dt = np.diff(minutes)
+    dt[dt <= 0] = np.nan
+    rate = np.diff(x) / dt
+    before, after = rate[:-1], rate[1:]
+    flags[1:-1] = (
+        (np.abs(before) > max_rate)
+        & (np.abs(after) > max_rate)
+        & (np.sign(before) != np.sign(after))
+    )
+    return flags
+
+
+def flat_check(x, min_run, flat_ok=()):
+    """Flag runs of at least `min_run` identical values (NaN breaks a run)."""
+    if len(x) == 0:
+        return np.zeros(0, dtype=bool)
+    same = np.r_[False, x[1:] == x[:-1]]
+    run_id = np.cumsum(~same)
+    run_len = np.bincount(run_id)[run_id]
+    flags = run_len >= min_run
+    if flat_ok:
+        flags &= ~np.isin(x, flat_ok)
+    return flags & ~np.isnan(x)
+
+
+def qc_flags(values, minutes, rules):
+    """uint8 flag array for one variable."""
+    x = np.asarray(values, dtype="float64")
+    flags = np.zeros(len(x), dtype="uint8")
+    if "range" in rules:
+        flags[range_check(x, *rules["range"])] |= QC_RANGE
+    if "spike" in rules:
+        flags[spike_check(x, minutes, rules["spike"])] |= QC_SPIKE
+    if "flat" in rules:
+        flags[flat_check(x, rules["flat"], rules.get("flat_ok", ()))] |= QC_FLAT
+    return flags
+
+
+def minutes_since_epoch(times):
+    return np.asarray(times, dtype="datetime64[s]").astype("int64") / 60.0
+
+
+# -----------------------------
+# BACKFILL
+# -----------------------------
+def backfill(nc_file, out_file=None, rules=QC_RULES):
+    """Compute flags for the whole archive and store them in the NetCDF file."""
+    out_file = out_file or nc_file
+    with xr.open_dataset(nc_file, decode_timedelta=True) as ds:
+        ds = ds.sortby("time").load()
+
+    minutes = minutes_since_epoch(ds["time"].values)
+    for var, var_rules in rules.items():
+        if var in ds.data_vars and ds[var].dims == ("time",):
+            flags = qc_flags(ds[var].values, minutes, var_rules)
+            ds[var + QC_SUFFIX] = ("time", flags, {
+                "flag_masks": [QC_RANGE, QC_SPIKE, QC_FLAT],
+                "flag_meanings": "range spike flat",
+            })
+
+    tmp = out_file + ".tmp"
+    ds.to_netcdf(tmp)
+    os.replace(tmp, out_file)
+    return ds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill QC flags for the station archive.")
+    parser.add_argument("nc_file", help="station archive (NetCDF)")
+    parser.add_argument("out_file", nargs="?", help="defaults to rewriting nc_file")
+    args = parser.parse_args()
+
+    ds = backfill(args.nc_file, args.out_file)
+    for var in QC_RULES:
+        if var + QC_SUFFIX in ds:
+            flags = ds[var + QC_SUFFIX].values
+            print(f"{var}: {np.count_nonzero(flags)} of {flags.size} flagged")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# radar.py
+# Shared helpers for the BREF radar frames (file listing, PR window, dBZ decoding, colors)
+
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.warp import transform_bounds
+from rasterio.windows import bounds as window_bounds
+from rasterio.windows import Window, from_bounds
+
+RADAR_DIR = "radar_images"
+RADAR_PATTERN = re.compile(r"_(\d{8})_(\d{6})\.tif$")
+
+# Puerto Rico window (west, south, east, north) in lon/lat
+PR_BOUNDS = (-67.6, 17.6, -65.1, 18.8)
+
+# Weakest reflectivity (dBZ) treated as an echo; weaker ones are transparent
+DBZ_MIN = 10
+
+# The BREF GeoTIFFs are RGBA renderings (alpha 0 or 255) of reflectivity on the
+# NWS ramp below, not dBZ grids. Anchors every 5 dBZ were recovered from the
+# frames themselves: the ramp is linear in between and values come in 0.5 dBZ
+# steps, so every colour in the frames lies within 1 unit of a ramp entry.
+BREF_RAMP = [
+    (0, (149, 155, 181)),
+    (5, (99, 118, 168)),
+    (10, (67, 94, 159)),
+    (15, (94, 173, 207)),
+    (20, (82, 214, 162)),
+    (25, (14, 214, 20)),
+    (30, (11, 136, 15)),
+    (35, (9, 94, 9)),
+    (40, (255, 226, 0)),
+    (45, (255, 177, 0)),
+    (50, (255, 0, 0)),
+    (55, (177, 0, 0)),
+    (60, (255, 255, 255)),
+]
+BREF_STEP = 0.5
+MAX_COLOR_ERROR = 6    # colours further than this from the ramp are not data
+
+
+def frame_time(path):
+    """UTC time of a radar frame from its file name (…_YYYYMMDD_HHMMSS.tif)."""
+    m = RADAR_PATTERN.search(str(path))
+    if m is None:
+        return None
+    return pd.to_datetime(m.group(1) + m.group(2), format="%Y%m%d%H%M%S")
+
+
+def radar_frames(radar_dir=RADAR_DIR):
+    """Frame paths sorted by time."""
+    paths = [p for p in Path(radar_dir).glob("*.tif") if frame_time(p) is not None]
+    return sorted(paths, key=frame_time)
+
+
+def ramp_table(ramp=BREF_RAMP, step=BREF_STEP):
+    """(dBZ values, float RGB rows) of `ramp` sampled every `step` dBZ."""
+    anchors = np.array([d for d, _ in ramp], dtype="float32")
+    colors = np.array([c for _, c in ramp], dtype="float32")
+    dbz = np.arange(anchors[0], anchors[-1] + step / 2, step, dtype="float32")
+    rgb = np.stack([np.interp(dbz, anchors, colors[:, k]) for k in range(3)], axis=1)
+    return dbz, rgb
+
+
+# Built once at import; every frame read goes through this table
+RAMP_DBZ, RAMP_RGB = ramp_table()
+
+
+def rgba_to_dbz(rgba):
+    """dBZ of a (4, rows, cols) RGBA block by nearest ramp colour.
+
+    NaN where transparent or where the colour is not on the ramp. Each
+    distinct colour is looked up once.
+    """
+    rgb = rgba[:3].reshape(3, -1).astype("uint32")
+    packed = (rgb[0] << 16) | (rgb[1] << 8) | rgb[2]
+    colors, inverse = np.unique(packed, return_inverse=True)
+    unpacked = np.stack([colors >> 16, (colors >> 8) & 255, colors & 255], axis=1).astype("float32")
+
+    err = np.abs(unpacked[:, None, :] - RAMP_RGB[None, :, :]).max(axis=-1)
+    nearest = err.argmin(axis=1)
+    values = np.where(err[np.arange(len(colors)), nearest] <= MAX_COLOR_ERROR,
+                      RAMP_DBZ[nearest], np.nan)
+
+    dbz = values[inverse.ravel()].reshape(rgba.shape[1:]).astype("float32")
+    dbz[rgba[3] == 0] = np.nan
+    return dbz
+
+
+def read_dbz(src, window):
+    """dBZ array of `window` from an open frame (RGBA rendering or 1-band grid)."""
+    if src.count >= 4:
+        return rgba_to_dbz(src.read((1, 2, 3, 4), window=window))
+    return src.read(1, window=window, masked=True).astype("float32").filled(np.nan)
+
+
+def read_region(path, bounds=PR_BOUNDS):
+    """Read the part of a frame inside lon/lat `bounds`.
+
+    Returns (dBZ array with NaN for nodata, lon/lat bounds of the array,
+    (x, y) pixel size in km).
+    """
+    with rasterio.open(path) as src:
+        native = transform_bounds("EPSG:4326", src.crs, *bounds)
+        window = from_bounds(*native, transform=src.transform).round_offsets().round_lengths()
+        window = window.intersection(Window(0, 0, src.width, src.height))
+        data = read_dbz(src, window)
+
+        win_transform = src.window_transform(window)
+        w, s, e, n = window_bounds(window, src.transform)
+        latlon = transform_bounds(src.crs, "EPSG:4326", w, s, e, n)
+
+        px, py = abs(win_transform.a), abs(win_transform.e)
+        if src.crs.is_geographic:
+            lat = (latlon[1] + latlon[3]) / 2
+            pixel_km = (px * 111.32 * np.cos(np.deg2rad(lat)), py * 110.57)
+        else:
+            pixel_km = (px / 1000.0, py / 1000.0)
+    return data, latlon, pixel_km
+
+
+def colorize(dbz, vmin=DBZ_MIN, alpha=180):
+    """RGBA uint8 image of a dBZ array on the BREF ramp (the frames' own colours).
+
+    Echoes below `vmin` and NaN are transparent.
+    """
+    values = np.nan_to_num(dbz, nan=RAMP_DBZ[0])
+    rgba = np.empty(np.shape(dbz) + (4,), dtype="uint8")
+    for k in range(3):
+        rgba[..., k] = np.interp(values, RAMP_DBZ, RAMP_RGB[:, k]).round()
+    rgba[..., 3] = np.where(np.isnan(dbz) | (dbz < vmin), 0, alpha)
+    return rgba
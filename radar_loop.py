@@ -0,0 +1,143 @@
+# radar_loop.py
+# Animated radar loop encoded once as a single WebP and served as a static file
+#
+# Each frame is colorized, projected to Web Mercator, captioned and encoded to
+# WebP once when it arrives; the last LOOP_FRAMES encoded frames are kept in a
+# deque. A new frame costs one encode plus a byte-level mux of the cached
+# frames into an animated WebP container (no re-encoding). Viewers fetch one
+# small file (cached by the browser until the next frame) instead of one
+# base64 overlay per frame.
+
+import io
+import os
+import struct
+import threading
+from collections import deque
+
+import pandas as pd
+from folium.utilities import mercator_transform
+from PIL import Image, ImageDraw, ImageFont
+
+from radar import PR_BOUNDS, RAMP_DBZ, colorize, frame_time, radar_frames, read_region
+from units import UTC_OFFSET_HOURS
+
+LOOP_FILE = os.path.join("static", "radar_loop.webp")
+LOOP_URL = "/app/static/radar_loop.webp"
+LOOP_FRAMES = 32
+FRAME_MS = 250
+LAST_FRAME_MS = 1500     # hold the newest frame before looping
+
+MESES = ["ene", "feb", "mar", "abr", "may", "jun",
+         "jul", "ago", "sep", "oct", "nov", "dic"]
+
+
+def caption_text(t):
+    """Local (UTC-4) time caption for a frame."""
+    hora = t + pd.Timedelta(hours=UTC_OFFSET_HOURS)
+    return f"{hora.day}/{MESES[hora.month - 1]} {hora.strftime('%I:%M %p')}"
+
+
+def render_frame(path, bounds=PR_BOUNDS):
+    """Colorized, captioned RGBA image of one frame and its lon/lat bounds.
+
+    Every decoded echo is drawn in the source's own colours, as in the
+    original frame. The image is projected to Web Mercator (as ImageOverlay's
+    mercator_project does), so it lines up with the map tiles and the nowcast
+    overlay.
+    """
+    dbz, latlon, _ = read_region(path, bounds)
+    rgba = mercator_transform(colorize(dbz, vmin=RAMP_DBZ[0]), (latlon[1], latlon[3]), origin="upper")
+    img = Image.fromarray(rgba.round().astype("uint8"))
+
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default()
+    text = caption_text(frame_time(path))
+    left, top, right, bottom = draw.textbbox((4, 4), text, font=font)
+    draw.rectangle((left - 3, top - 3, right + 3, bottom + 3), fill=(255, 255, 255, 200))
+    draw.text((4, 4), text, fill=(0, 0, 0, 255), font=font)
+    return img, latlon
+
+
+# -----------------------------
+# WEBP MUXING
+# -----------------------------
+def _chunk(fourcc, payload):
+    pad = b"\0" if len(payload) % 2 else b""
+    return fourcc + struct.pack("<I", len(payload)) + payload + pad
+
+
+def _u24(n):
+    return struct.pack("<I", n)[:3]
+
+
+def encode_frame(img, quality=70, method=4):
+    """Encode one still frame; returns its WebP image chunks (ALPH/VP8 or VP8L)."""
+    buf = io.BytesIO()
+    img.save(buf, format="WEBP", quality=quality, method=method)
+    data = buf.getvalue()
+    chunks, pos = [], 12   # skip "RIFF" <size> "WEBP"
+    while pos + 8 <= len(data):
+        fourcc = data[pos:pos + 4]
+        size = struct.unpack("<I", data[pos + 4:pos + 8])[0]
+        end = pos + 8 + size + (size % 2)
+        if fourcc in (b"ALPH", b"VP8 ", b"VP8L"):
+            chunks.append(data[pos:end])
+        pos = end
+    return b"".join(chunks)
+
+
+def mux_webp(frames, durations, size, loop=0):
+    """Animated WebP from already-encoded full-canvas frames (see encode_frame)."""
+    width, height = size
+    vp8x = bytes([0x10 | 0x02, 0, 0, 0]) + _u24(width - 1) + _u24(height - 1)   # alpha, animation
+    anim = bytes(4) + struct.pack("<H", loop)   # transparent background
+    body = [_chunk(b"VP8X", vp8x), _chunk(b"ANIM", anim)]
+    for data, duration in zip(frames, durations):
+        # No blending: every frame replaces the canvas, transparent pixels included
+        header = _u24(0) + _u24(0) + _u24(width - 1) + _u24(height - 1) + _u24(duration) + b"\x02"
+        body.append(_chunk(b"ANMF", header + data))
+    payload = b"WEBP" + b"".join(body)
+    return b"RIFF" + struct.pack("<I", len(payload)) + payload
+
+
+class RadarLoop:
+    """Rolling animated WebP of the most recent radar frames."""
+
+    def __init__(self, out_file=LOOP_FILE, max_frames=LOOP_FRAMES, bounds=PR_BOUNDS):
+        self.out_file = out_file
+        self.bounds = bounds
+        self.frames = deque(maxlen=max_frames)   # (time, encoded frame)
+        self.size = None
+        self.latlon = None
+        self.lock = threading.Lock()
+
+    @property
+    def version(self):
+        """Changes with every new frame; used to bust browser caches."""
+        return int(self.frames[-1][0].timestamp()) if self.frames else 0
+
+    def update(self, radar_dir=None):
+        """Render and encode frames newer than the last one; re-mux if any arrived."""
+        paths = radar_frames() if radar_dir is None else radar_frames(radar_dir)
+        last = self.frames[-1][0] if self.frames else None
+        new = [p for p in paths[-self.frames.maxlen:] if last is None or frame_time(p) > last]
+        for path in new:
+            img, self.latlon = render_frame(path, self.bounds)
+            if img.size != self.size:
+                # Grid changed: frames of different sizes can't share a canvas
+                self.frames.clear()
+                self.size = img.size
+            self.frames.append((frame_time(path), encode_frame(img)))
+        if new:
+            self.encode()
+        return len(new)
+
+    def encode(self):
+        frames = [data for _, data in self.frames]
+        durations = [FRAME_MS] * (len(frames) - 1) + [LAST_FRAME_MS]
+
+        os.makedirs(os.path.dirname(self.out_file) or ".", exist_ok=True)
+        tmp = self.out_file + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(mux_webp(frames, durations, self.size))
+        os.replace(tmp, self.out_file)
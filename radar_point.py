@@ -0,0 +1,78 @@
+# radar_point.py
+# Reflectivity time series at the station extracted from the BREF GeoTIFFs
+#
+# Frames share one grid, so the station pixel is computed once from the raster
+# transform and every frame is read through a small window around it (only
+# the blocks covering the window are decoded, never the whole raster).
+
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.warp import transform as warp_transform
+from rasterio.windows import Window
+
+from radar import RADAR_DIR, frame_time, radar_frames, read_dbz
+from units import UTC_OFFSET_HOURS
+
+# Balneario Punta Salinas, Toa Baja
+STATION_LAT = 18.4717
+STATION_LON = -66.1858
+
+# Half-size of the neighbourhood window, in pixels
+NEIGHBOURHOOD_PX = 2
+
+
+@lru_cache(maxsize=8)
+def station_window(transform, crs, width, height, lon=STATION_LON, lat=STATION_LAT,
+                   radius=NEIGHBOURHOOD_PX):
+    """(row, col) of the station and the read window around it for one grid."""
+    xs, ys = warp_transform("EPSG:4326", crs, [lon], [lat])
+    col, row = ~transform * (xs[0], ys[0])
+    row, col = int(np.floor(row)), int(np.floor(col))
+    if not (0 <= row < height and 0 <= col < width):
+        raise ValueError("Station is outside the radar grid")
+
+    r0, c0 = max(row - radius, 0), max(col - radius, 0)
+    r1, c1 = min(row + radius + 1, height), min(col + radius + 1, width)
+    return (row - r0, col - c0), Window(c0, r0, c1 - c0, r1 - r0)
+
+
+def sample_frame(path, lon=STATION_LON, lat=STATION_LAT, radius=NEIGHBOURHOOD_PX):
+    """Reflectivity at the station pixel plus max/mean of its neighbourhood."""
+    with rasterio.open(path) as src:
+        (r, c), window = station_window(src.transform, src.crs.to_string(), src.width, src.height,
+                                        lon, lat, radius)
+        block = read_dbz(src, window)
+
+    if np.all(np.isnan(block)):
+        return np.nan, np.nan, np.nan
+    return float(block[r, c]), float(np.nanmax(block)), float(np.nanmean(block))
+
+
+# Per-file results keyed by (path, mtime): only new frames are read on refresh.
+# Entries for frames no longer on disk are dropped on every call.
+_samples = {}
+_samples_lock = threading.Lock()
+
+
+def station_reflectivity(radar_dir=RADAR_DIR, lon=STATION_LON, lat=STATION_LAT,
+                         radius=NEIGHBOURHOOD_PX):
+    """DataFrame of reflectivity (dBZ) at the station across all frames."""
+    rows = []
+    with _samples_lock:
+        current = {}
+        for path in radar_frames(radar_dir):
+            key = (str(path), os.path.getmtime(path), lon, lat, radius)
+            current[key] = _samples[key] if key in _samples else sample_frame(path, lon, lat, radius)
+            point, nmax, nmean = current[key]
+            rows.append((frame_time(path), point, nmax, nmean))
+        _samples.clear()
+        _samples.update(current)
+
+    df = pd.DataFrame(rows, columns=["time", "bref_point", "bref_max", "bref_mean"])
+    df["Hora"] = df["time"] + pd.Timedelta(hours=UTC_OFFSET_HOURS)
+    return df
@@ -0,0 +1,266 @@
+# running_stats.py
+# Incremental rolling-window statistics and daily summaries for the station feed
+#
+# Every observation is pushed once; min/max come from monotonic deques and
+# mean/variance from Welford's update (with its inverse for evictions), so each
+# new row costs O(1) amortized no matter how long the archive is. The state is
+# saved to JSON so a restart continues where it left off instead of rescanning.
+
+import json
+import math
+import os
+import tempfile
+import threading
+from collections import deque
+
+import numpy as np
+
+from units import UTC_OFFSET_HOURS
+
+# -----------------------------
+# DEFAULTS
+# -----------------------------
+WINDOWS = {
+    "1h": 3600,
+    "24h": 86400,
+    "day": "day",  # calendar day in local station time
+}
+
+SUMMARY_VARIABLES = [
+    "air_temperature",
+    "wind_avg",
+    "wind_gust",
+    "rain_accumulated",
+    "uv",
+    "relative_humidity",
+    "lightning_strike_avg_distance",
+]
+
+
+
+def local_day(t, utc_offset_hours=UTC_OFFSET_HOURS):
+    """Day number (days since epoch) of epoch second `t` in local time."""
+    return int((t + utc_offset_hours * 3600) // 86400)
+
+
+# -----------------------------
+# WINDOW STATISTICS
+# -----------------------------
+class WindowStats:
+    """Min, max, sum, mean and variance over a sliding time window.
+
+    `window` is a length in seconds or "day" for the current calendar day.
+    """
+
+    def __init__(self, window, utc_offset_hours=UTC_OFFSET_HOURS):
+        self.window = window
+        self.utc_offset_hours = utc_offset_hours
+        self.values = deque()   # (t, v) in arrival order
+        self.maxq = deque()     # (t, v) with decreasing v
+        self.minq = deque()     # (t, v) with increasing v
+        self.day = None
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def _clear(self):
+        self.values.clear()
+        self.maxq.clear()
+        self.minq.clear()
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def _remove_oldest(self):
+        t, v = self.values.popleft()
+        if self.maxq and self.maxq[0][0] == t:
+            self.maxq.popleft()
+        if self.minq and self.minq[0][0] == t:
+            self.minq.popleft()
+        self.total -= v
+        if self.count == 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        # Inverse Welford step
+        old_mean = self.mean
+        self.count -= 1
+        self.mean = (old_mean * (self.count + 1) - v) / self.count
+        self.m2 = max(self.m2 - (v - old_mean) * (v - self.mean), 0.0)
+
+    def expire(self, now):
+        """Drop observations that have fallen out of the window at `now`."""
+        if self.window == "day":
+            day = local_day(now, self.utc_offset_hours)
+            if day != self.day:
+                self._clear()
+                self.day = day
+            return
+        cutoff = now - self.window
+        while self.values and self.values[0][0] <= cutoff:
+            self._remove_oldest()
+
+    def push(self, t, v):
+        self.expire(t)
+        if v is None or math.isnan(v):
+            return
+
+        self.values.append((t, v))
+        while self.maxq and self.maxq[-1][1] <= v:
+            self.maxq.pop()
+        self.maxq.append((t, v))
+        while self.minq and self.minq[-1][1] >= v:
+            self.minq.pop()
+        self.minq.append((t, v))
+
+        self.total += v
+        self.count += 1
+        delta = v - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (v - self.mean)
+
+    def summary(self):
+        if self.count == 0:
+            return {"count": 0, "min": np.nan, "max": np.nan,
+                    "sum": 0.0, "mean": np.nan, "std": np.nan}
+        std = math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+        return {
+            "count": self.count,
+            "min": self.minq[0][1],
+            "max": self.maxq[0][1],
+            "sum": self.total,
+            "mean": self.mean,
+            "std": std,
+        }
+
+    def to_dict(self):
+        return {
+            "window": self.window,
+            "values": list(self.values),
+            "maxq": list(self.maxq),
+            "minq": list(self.minq),
+            "day": self.day,
+            "count": self.count,
+            "total": self.total,
+            "mean": self.mean,
+            "m2": self.m2,
+        }
+
+    @classmethod
+    def from_dict(cls, d, utc_offset_hours=UTC_OFFSET_HOURS):
+        ws = cls(d["window"], utc_offset_hours)
+        ws.values = deque(tuple(x) for x in d["values"])
+        ws.maxq = deque(tuple(x) for x in d["maxq"])
+        ws.minq = deque(tuple(x) for x in d["minq"])
+        ws.day = d["day"]
+        ws.count = d["count"]
+        ws.total = d["total"]
+        ws.mean = d["mean"]
+        ws.m2 = d["m2"]
+        return ws
+
+
+# -----------------------------
+# STATION STATISTICS
+# -----------------------------
+class StationStats:
+    """WindowStats for every (variable, window) pair of one station."""
+
+    def __init__(self, variables=SUMMARY_VARIABLES, windows=WINDOWS,
+                 utc_offset_hours=UTC_OFFSET_HOURS):
+        self.variables = list(variables)
+        self.windows = dict(windows)
+        self.utc_offset_hours = utc_offset_hours
+        self.last_time = None
+        self.lock = threading.Lock()
+        self.stats = {
+            var: {name: WindowStats(w, utc_offset_hours) for name, w in self.windows.items()}
+            for var in self.variables
+        }
+
+    def update(self, t, values):
+        """Push one observation (epoch seconds, {variable: value})."""
+        if self.last_time is not None and t <= self.last_time:
+            return False
+        for var, windows in self.stats.items():
+            v = values.get(var)
+            v = np.nan if v is None else float(v)
+            for ws in windows.values():
+                ws.push(t, v)
+        self.last_time = t
+        return True
+
+    def update_frame(self, df, time_col="time"):
+        """Push only the rows of `df` newer than the last one seen.
+
+        Returns the number of new observations consumed.
+        """
+        t = df[time_col].values.astype("datetime64[s]").astype("int64")
+        order = np.argsort(t, kind="stable")
+        t = t[order]
+        start = 0 if self.last_time is None else np.searchsorted(t, self.last_time, side="right")
+        if start >= len(t):
+            return 0
+
+        columns = {
+            var: df[var].to_numpy(dtype="float64")[order][start:]
+            for var in self.variables if var in df.columns
+        }
+        n = 0
+        for i, ti in enumerate(t[start:]):
+            if self.update(int(ti), {var: col[i] for var, col in columns.items()}):
+                n += 1
+        return n
+
+    def summary(self, var, window, now=None):
+        """Statistics of `var` over `window`, expired up to `now` if given."""
+        ws = self.stats[var][window]
+        if now is not None:
+            ws.expire(now)
+        return ws.summary()
+
+    # -----------------------------
+    # PERSISTENCE
+    # -----------------------------
+    def to_dict(self):
+        return {
+            "utc_offset_hours": self.utc_offset_hours,
+            "last_time": self.last_time,
+            "windows": self.windows,
+            "stats": {
+                var: {name: ws.to_dict() for name, ws in windows.items()}
+                for var, windows in self.stats.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        obj = cls(d["stats"].keys(), d["windows"], d["utc_offset_hours"])
+        obj.last_time = d["last_time"]
+        obj.stats = {
+            var: {name: WindowStats.from_dict(w, obj.utc_offset_hours) for name, w in windows.items()}
+            for var, windows in d["stats"].items()
+        }
+        return obj
+
+    def save(self, path):
+        """Write the state atomically so a crash never leaves a partial file."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, variables=SUMMARY_VARIABLES, windows=WINDOWS):
+        """Load saved state, or start empty if missing or the layout changed."""
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    obj = cls.from_dict(json.load(f))
+                if obj.variables == list(variables) and obj.windows == dict(windows):
+                    return obj
+            except (OSError, ValueError, KeyError):
+                pass
+        return cls(variables, windows)
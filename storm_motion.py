@@ -0,0 +1,204 @@
+# storm_motion.py
+# Storm motion and 30-minute reflectivity nowcast from consecutive BREF frames
+#
+# The PR window of each frame is cut into overlapping tiles that cover every
+# pixel and the motion of every tile is found by phase correlation (batched
+# FFTs over all tiles at once). The FFT of
+# the latest frame is kept, so each new frame costs one forward FFT and one
+# correlation against its predecessor. The motion field is smoothed over time
+# and used to advect the latest frame forward (semi-Lagrangian, backward).
+# After a gap between frames the motion is re-estimated from scratch, since a
+# shift beyond half a tile wraps around in the correlation.
+
+import threading
+
+import numpy as np
+
+from radar import DBZ_MIN, PR_BOUNDS, frame_time, radar_frames, read_region
+
+TILE_PX = 32
+TILE_STEP = 16             # tiles overlap by half
+MAX_GAP_MIN = 10           # longer gaps reset the motion instead of blending it
+MIN_ECHO_FRACTION = 0.02   # tiles with less echo than this borrow the median motion
+MIN_PEAK = 0.08            # weaker correlation peaks are not trusted
+SMOOTHING = 0.5            # weight of the newest motion estimate
+NOWCAST_MIN = 30
+
+
+# -----------------------------
+# PHASE CORRELATION
+# -----------------------------
+def tile_starts(n, tile=TILE_PX, step=TILE_STEP):
+    """Tile offsets along an axis of length `n`; the last tile ends at the edge."""
+    starts = np.arange(0, max(n - tile, 0) + 1, step)
+    if starts[-1] < n - tile:
+        starts = np.append(starts, n - tile)
+    return starts
+
+
+def to_tiles(field, tile=TILE_PX, step=TILE_STEP):
+    """(ny, nx, tile, tile) overlapping tiles covering all of `field`."""
+    pad = ((0, max(tile - field.shape[0], 0)), (0, max(tile - field.shape[1], 0)))
+    field = np.pad(field, pad)
+    windows = np.lib.stride_tricks.sliding_window_view(field, (tile, tile))
+    return windows[tile_starts(field.shape[0], tile, step)][:, tile_starts(field.shape[1], tile, step)]
+
+
+def nearest_tile(n, tile=TILE_PX, step=TILE_STEP):
+    """Index of the tile whose centre is nearest to each of `n` pixels."""
+    centres = tile_starts(max(n, tile), tile, step) + tile / 2
+    return np.abs(np.arange(n)[:, None] + 0.5 - centres[None, :]).argmin(axis=1)
+
+
+def tile_spectra(dbz, tile=TILE_PX, step=TILE_STEP):
+    """FFTs of all tiles plus each tile's echo fraction."""
+    echo = np.where(np.isnan(dbz) | (dbz < DBZ_MIN), 0.0, dbz).astype("float32")
+    tiles = to_tiles(echo, tile, step)
+    taper = np.outer(np.hanning(tile), np.hanning(tile)).astype("float32")
+    spectra = np.fft.fft2(tiles * taper, axes=(-2, -1))
+    fraction = (tiles > 0).mean(axis=(-2, -1))
+    return spectra, fraction
+
+
+def _subpixel(left, centre, right):
+    """Parabolic peak refinement along one axis given the three samples."""
+    denom = left - 2 * centre + right
+    with np.errstate(divide="ignore", invalid="ignore"):
+        offset = np.where(np.abs(denom) > 1e-12, 0.5 * (left - right) / denom, 0.0)
+    return np.clip(offset, -0.5, 0.5)
+
+
+def tile_shifts(prev_spectra, spectra):
+    """(dy, dx) pixel displacement from prev to current per tile, and peak height."""
+    cross = np.conj(prev_spectra) * spectra
+    cross /= np.abs(cross) + 1e-9
+    r = np.fft.ifft2(cross, axes=(-2, -1)).real
+
+    ny, nx, t, _ = r.shape
+    flat = r.reshape(ny, nx, -1)
+    idx = flat.argmax(axis=-1)
+    py, px = np.divmod(idx, t)
+    peak = np.take_along_axis(flat, idx[..., None], axis=-1)[..., 0]
+
+    jj, ii = np.meshgrid(np.arange(ny), np.arange(nx), indexing="ij")
+    dy = py + _subpixel(r[jj, ii, (py - 1) % t, px], peak, r[jj, ii, (py + 1) % t, px])
+    dx = px + _subpixel(r[jj, ii, py, (px - 1) % t], peak, r[jj, ii, py, (px + 1) % t])
+
+    # Peaks past the midpoint are negative shifts
+    dy = np.where(dy > t / 2, dy - t, dy)
+    dx = np.where(dx > t / 2, dx - t, dx)
+    return np.stack([dy, dx], axis=-1), peak
+
+
+# -----------------------------
+# TRACKER
+# -----------------------------
+class StormTracker:
+    """Incremental motion tracker; feed it frames in time order."""
+
+    def __init__(self, bounds=PR_BOUNDS, tile=TILE_PX, step=TILE_STEP, smoothing=SMOOTHING):
+        self.bounds = bounds
+        self.tile = tile
+        self.step = step
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+        self.seen = set()
+        self.time = None
+        self.dbz = None
+        self.latlon = None
+        self.pixel_km = None   # (x, y) km per pixel
+        self.spectra = None
+        self.fraction = None
+        self.motion = None     # (ny, nx, 2) tile motion in px/min (dy, dx)
+
+    def update(self, radar_dir=None):
+        """Process any frames not seen yet; returns how many were added."""
+        paths = radar_frames() if radar_dir is None else radar_frames(radar_dir)
+        added = 0
+        for path in paths:
+            if str(path) not in self.seen:
+                self.add_frame(path)
+                added += 1
+        # Forget frames that were pruned from disk
+        self.seen.intersection_update(str(p) for p in paths)
+        return added
+
+    def add_frame(self, path):
+        t = frame_time(path)
+        self.seen.add(str(path))
+        if self.time is not None and t <= self.time:
+            return
+
+        dbz, latlon, pixel_km = read_region(path, self.bounds)
+        spectra, fraction = tile_spectra(dbz, self.tile, self.step)
+
+        if (self.spectra is None or self.spectra.shape != spectra.shape
+                or (t - self.time).total_seconds() / 60.0 > MAX_GAP_MIN):
+            # No usable predecessor: the motion is estimated afresh from the next pair
+            self.motion = None
+        else:
+            minutes = (t - self.time).total_seconds() / 60.0
+            shifts, peak = tile_shifts(self.spectra, spectra)
+            valid = (
+                (fraction >= MIN_ECHO_FRACTION)
+                & (self.fraction >= MIN_ECHO_FRACTION)
+                & (peak >= MIN_PEAK)
+            )
+            if valid.any():
+                fallback = np.median(shifts[valid], axis=0)
+            else:
+                fallback = np.zeros(2)
+            shifts[~valid] = fallback
+            estimate = shifts / minutes
+
+            if self.motion is None:
+                self.motion = estimate
+            else:
+                self.motion = self.smoothing * estimate + (1 - self.smoothing) * self.motion
+
+        self.time, self.dbz, self.latlon, self.pixel_km = t, dbz, latlon, pixel_km
+        self.spectra, self.fraction = spectra, fraction
+
+    # -----------------------------
+    # OUTPUTS
+    # -----------------------------
+    def motion_field(self):
+        """Per-pixel (dy, dx) motion in px/min on the grid of the latest frame."""
+        h, w = self.dbz.shape
+        rows = nearest_tile(h, self.tile, self.step)
+        cols = nearest_tile(w, self.tile, self.step)
+        return self.motion[rows][:, cols]
+
+    def mean_motion(self):
+        """(speed km/h, heading degrees from north the storms move toward)."""
+        if self.motion is None:
+            return np.nan, np.nan
+        dy, dx = self.motion.reshape(-1, 2).mean(axis=0)
+        km_x, km_y = self.pixel_km
+        east = dx * km_x * 60
+        north = -dy * km_y * 60
+        return float(np.hypot(east, north)), float(np.degrees(np.arctan2(east, north)) % 360)
+
+    def nowcast(self, lead_min=NOWCAST_MIN):
+        """Latest frame advected `lead_min` minutes forward (NaN where unknown)."""
+        if self.motion is None:
+            return None
+        h, w = self.dbz.shape
+        disp = self.motion_field() * lead_min
+        rows, cols = np.indices((h, w))
+        src_r = np.rint(rows - disp[..., 0]).astype(int)
+        src_c = np.rint(cols - disp[..., 1]).astype(int)
+        inside = (src_r >= 0) & (src_r < h) & (src_c >= 0) & (src_c < w)
+        out = np.full((h, w), np.nan, dtype="float32")
+        out[inside] = self.dbz[src_r[inside], src_c[inside]]
+        return out
+
+    def value_at(self, field, lon, lat):
+        """Value of a grid-aligned field at lon/lat (nearest pixel)."""
+        west, south, east, north = self.latlon
+        h, w = field.shape
+        r = int((north - lat) / (north - south) * h)
+        c = int((lon - west) / (east - west) * w)
+        if not (0 <= r < h and 0 <= c < w):
+            return np.nan
+        return float(field[r, c])
@@ -0,0 +1,30 @@
+# tests/test_dashboard.py
+# Headless run of the dashboard script with the radar frames shipped in the repo
+#
+#   python -m pytest tests
+
+import os
+import shutil
+
+import pytest
+
+AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+
+from loadtest import HERE, SCRIPT, prepare_workdir
+
+
+@pytest.fixture
+def workdir(monkeypatch):
+    path = prepare_workdir(days=3, radar_dir=os.path.join(HERE, "radar_images"))
+    monkeypatch.chdir(path)
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def test_dashboard_runs_with_radar_frames(workdir):
+    at = AppTest.from_file(os.path.join(workdir, SCRIPT), default_timeout=180).run()
+
+    assert not at.exception, [e.message for e in at.exception]
+    # The radar section ran and everything below it rendered too
+    assert os.path.getsize(os.path.join(workdir, "static", "radar_loop.webp")) > 0
+    assert "⬇️ Descargar Datos" in [e.label for e in at.expander]
@@ -0,0 +1,162 @@
+# tests/test_fetcher.py
+# AsyncFetcher against a local aiohttp TestServer
+#
+#   python -m pytest tests
+
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import fetcher
+from fetcher import AsyncFetcher, FetchError, FetchFatalError
+
+BODY = b"station data"
+ETAG = '"v1"'
+LAST_MODIFIED = "Mon, 19 Oct 2026 12:00:00 GMT"
+
+
+def make_app(hits):
+    """Routes counting their hits in `hits`."""
+
+    async def etag(request):
+        hits["etag"] += 1
+        if request.headers.get("If-None-Match") == ETAG:
+            return web.Response(status=304)
+        return web.Response(body=BODY, headers={"ETag": ETAG})
+
+    async def modified(request):
+        hits["modified"] += 1
+        if request.headers.get("If-Modified-Since") == LAST_MODIFIED:
+            return web.Response(status=304)
+        return web.Response(body=BODY, headers={"Last-Modified": LAST_MODIFIED})
+
+    async def flaky(request):
+        hits["flaky"] += 1
+        if hits["flaky"] < 3:
+            return web.Response(status=503)
+        return web.Response(body=BODY)
+
+    async def broken(request):
+        hits["broken"] += 1
+        return web.Response(status=500)
+
+    async def missing(request):
+        hits["missing"] += 1
+        return web.Response(status=404)
+
+    app = web.Application()
+    app.router.add_get("/etag", etag)
+    app.router.add_get("/modified", modified)
+    app.router.add_get("/flaky", flaky)
+    app.router.add_get("/broken", broken)
+    app.router.add_get("/missing", missing)
+    return app
+
+
+@pytest.fixture
+def run(tmp_path):
+    """Run `scenario(fetcher, server, hits)` against a fresh server and fetcher."""
+
+    def runner(scenario, **kwargs):
+        async def main():
+            hits = dict.fromkeys(["etag", "modified", "flaky", "broken", "missing"], 0)
+            async with TestServer(make_app(hits)) as server:
+                async with AsyncFetcher(str(tmp_path / "validators.json"), backoff_s=0.01,
+                                        **kwargs) as f:
+                    return await scenario(f, server, hits)
+
+        return asyncio.run(main())
+
+    return runner
+
+
+def test_200_returns_body(run):
+    async def scenario(f, server, hits):
+        assert await f.fetch(str(server.make_url("/etag"))) == BODY
+
+    run(scenario)
+
+
+def test_200_writes_dest(run, tmp_path):
+    dest = tmp_path / "out" / "weather_data.nc"
+
+    async def scenario(f, server, hits):
+        assert await f.fetch(str(server.make_url("/etag")), str(dest)) == str(dest)
+
+    run(scenario)
+    assert dest.read_bytes() == BODY
+    assert not (tmp_path / "out" / "weather_data.nc.part").exists()
+
+
+def test_304_with_etag(run):
+    async def scenario(f, server, hits):
+        url = str(server.make_url("/etag"))
+        assert await f.fetch(url) == BODY
+        assert f.validators[url] == {"etag": ETAG}
+        assert await f.fetch(url) is None
+        assert hits["etag"] == 2
+
+    run(scenario)
+
+
+def test_304_with_last_modified(run):
+    async def scenario(f, server, hits):
+        url = str(server.make_url("/modified"))
+        assert await f.fetch(url) == BODY
+        assert f.validators[url] == {"last_modified": LAST_MODIFIED}
+        assert await f.fetch(url) is None
+        assert hits["modified"] == 2
+
+    run(scenario)
+
+
+def test_no_conditional_request_without_dest_file(run, tmp_path):
+    # Validators are only sent if the cached file still exists
+    dest = tmp_path / "weather_data.nc"
+
+    async def scenario(f, server, hits):
+        url = str(server.make_url("/etag"))
+        await f.fetch(url, str(dest))
+        dest.unlink()
+        assert await f.fetch(url, str(dest)) == str(dest)
+
+    run(scenario)
+    assert dest.read_bytes() == BODY
+
+
+def test_retries_5xx(run):
+    async def scenario(f, server, hits):
+        assert await f.fetch(str(server.make_url("/flaky"))) == BODY
+        assert hits["flaky"] == 3
+
+    run(scenario)
+
+
+def test_gives_up_after_max_retries(run):
+    async def scenario(f, server, hits):
+        with pytest.raises(FetchError):
+            await f.fetch(str(server.make_url("/broken")))
+        assert hits["broken"] == 3
+
+    run(scenario, max_retries=2)
+
+
+def test_4xx_not_retried(run):
+    async def scenario(f, server, hits):
+        with pytest.raises(FetchFatalError):
+            await f.fetch(str(server.make_url("/missing")))
+        assert hits["missing"] == 1
+
+    run(scenario)
+
+
+def test_prune_frames(tmp_path):
+    names = [f"CARIB_L2_BREF_QCD_20261019_{h:02d}0000.tif" for h in range(5)]
+    for n in names:
+        (tmp_path / n).touch()
+    (tmp_path / "notes.txt").touch()
+
+    assert fetcher.prune_frames(tmp_path, keep=2) == names[:3]
+    assert sorted(p.name for p in tmp_path.iterdir()) == names[3:] + ["notes.txt"]
@@ -0,0 +1,52 @@
+# tests/test_storm_motion.py
+# Phase-correlation motion on synthetic reflectivity fields
+#
+#   python -m pytest tests
+
+import numpy as np
+import pytest
+
+from storm_motion import TILE_PX, nearest_tile, tile_shifts, tile_spectra, to_tiles
+
+
+def storm_field(shape, seed=0, cells=60):
+    """Gaussian echo cells (15-50 dBZ) on an empty background."""
+    rng = np.random.default_rng(seed)
+    rows, cols = np.indices(shape)
+    field = np.zeros(shape, dtype="float32")
+    for r, c, size, peak in zip(rng.uniform(0, shape[0], cells), rng.uniform(0, shape[1], cells),
+                                rng.uniform(3, 8, cells), rng.uniform(15, 50, cells)):
+        field = np.maximum(field, peak * np.exp(-((rows - r) ** 2 + (cols - c) ** 2) / (2 * size ** 2)))
+    return field
+
+
+@pytest.mark.parametrize("dy, dx", [(3, -5), (-2, 4), (0, 0), (6, 1)])
+def test_tile_shifts_recover_known_motion(dy, dx):
+    # Cut both frames from one larger field so echoes move in and out at the edges
+    big = storm_field((160, 290))
+    prev = big[20:140, 20:270]
+    cur = big[20 - dy:140 - dy, 20 - dx:270 - dx]
+
+    prev_spectra, prev_fraction = tile_spectra(prev)
+    spectra, fraction = tile_spectra(cur)
+    shifts, peak = tile_shifts(prev_spectra, spectra)
+
+    echo = (prev_fraction > 0.05) & (fraction > 0.05)
+    assert echo.sum() >= 10
+    np.testing.assert_allclose(np.median(shifts[echo], axis=0), [dy, dx], atol=0.5)
+
+
+def test_tiles_cover_every_pixel():
+    # The PR window (120 x 250) is not a multiple of the tile size
+    field = np.arange(120 * 250, dtype="float32").reshape(120, 250)
+    tiles = to_tiles(field)
+    assert tiles.shape[2:] == (TILE_PX, TILE_PX)
+    assert set(np.unique(tiles)) == set(field.ravel())
+    assert tiles[-1, -1, -1, -1] == field[-1, -1]
+
+
+def test_nearest_tile_spans_the_axis():
+    idx = nearest_tile(120)
+    assert idx[0] == 0
+    assert idx[-1] == to_tiles(np.zeros((120, 250))).shape[0] - 1
+    assert np.all(np.diff(idx) >= 0)
@@ -0,0 +1,110 @@
+# timeseries_store.py
+# Compact typed in-memory store for one station's observations
+#
+# Times are int64 epoch seconds and every variable is a float32 array (QC flags
+# uint8), instead of a long pandas frame of float64 columns plus datetime and
+# formatted string columns. Slices are searchsorted views; DataFrames are only
+# built for the rows being plotted and times are formatted at display time.
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from qc import QC_RULES, QC_SUFFIX, minutes_since_epoch, qc_flags
+from units import UTC_OFFSET_HOURS
+
+# How far back latest() looks for a variable's last valid value; older
+# readings are stale and reported as NaN (a couple of reporting intervals)
+LATEST_LOOKBACK_S = 10 * 60
+
+
+def format_time(t, fmt="%I:%M %p"):
+    """Local (UTC-4) display string for epoch second `t`."""
+    return pd.Timestamp(int(t) + UTC_OFFSET_HOURS * 3600, unit="s").strftime(fmt)
+
+
+# -----------------------------
+# STORE
+# -----------------------------
+class TimeSeriesStore:
+    """Columnar float32 store with int64 epoch-second timestamps."""
+
+    def __init__(self, times, columns):
+        order = np.argsort(times, kind="stable")
+        self.times = np.asarray(times, dtype="int64")[order]
+        self.columns = {v: np.asarray(c, dtype="float32")[order] for v, c in columns.items()}
+        self.flags = {}
+
+    @classmethod
+    def from_netcdf(cls, nc_file, variables=None):
+        with xr.open_dataset(nc_file, decode_timedelta=True) as ds:
+            if variables is None:
+                variables = [
+                    v for v in ds.data_vars
+                    if ds[v].dims == ("time",) and np.issubdtype(ds[v].dtype, np.number)
+                    and not v.endswith(QC_SUFFIX)
+                ]
+            times = ds["time"].values.astype("datetime64[s]").astype("int64")
+            columns = {v: ds[v].values.astype("float32") for v in variables}
+        return cls(times, columns)
+
+    @property
+    def variables(self):
+        return list(self.columns)
+
+    def nbytes(self):
+        return self.times.nbytes + sum(c.nbytes for c in self.columns.values()) \
+            + sum(f.nbytes for f in self.flags.values())
+
+    # -----------------------------
+    # QC
+    # -----------------------------
+    def apply_qc(self, rules=QC_RULES, mask=True):
+        """Store "<var>_qc" flags and (optionally) blank flagged values."""
+        minutes = minutes_since_epoch(self.times.astype("datetime64[s]"))
+        for var, var_rules in rules.items():
+            if var in self.columns:
+                flags = qc_flags(self.columns[var], minutes, var_rules)
+                self.flags[var] = flags
+                if mask:
+                    self.columns[var][flags != 0] = np.nan
+        return self
+
+    # -----------------------------
+    # ACCESS
+    # -----------------------------
+    def index_range(self, start=None, end=None):
+        """[i0, i1) covering epoch seconds start..end inclusive."""
+        i0 = 0 if start is None else np.searchsorted(self.times, start, side="left")
+        i1 = len(self.times) if end is None else np.searchsorted(self.times, end, side="right")
+        return i0, i1
+
+    def slice(self, start=None, end=None, variables=None):
+        """(times, {var: values}) views for start..end (epoch seconds)."""
+        i0, i1 = self.index_range(start, end)
+        return self.times[i0:i1], {v: self.columns[v][i0:i1] for v in variables or self.columns}
+
+    def latest(self, lookback_s=LATEST_LOOKBACK_S):
+        """(t, {var: last non-NaN value}) within `lookback_s` of the newest row."""
+        if len(self.times) == 0:
+            return None, {}
+        t = int(self.times[-1])
+        i0, _ = self.index_range(t - lookback_s)
+        last = {}
+        for var, arr in self.columns.items():
+            valid = np.flatnonzero(~np.isnan(arr[i0:]))
+            last[var] = arr[i0 + valid[-1]] if len(valid) else np.nan
+        return t, last
+
+    def to_frame(self, start=None, end=None, variables=None, include_flags=True):
+        """DataFrame ("time", "Hora" and variables) for plotting a slice."""
+        i0, i1 = self.index_range(start, end)
+        times, values = self.slice(start, end, variables)
+        df = pd.DataFrame(values)
+        df.insert(0, "time", times.astype("datetime64[s]").astype("datetime64[ns]"))
+        df.insert(1, "Hora", df["time"] + pd.Timedelta(hours=UTC_OFFSET_HOURS))
+        if include_flags:
+            for var, flags in self.flags.items():
+                if var in df.columns:
+                    df[var + QC_SUFFIX] = flags[i0:i1]
+        return df
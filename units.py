@@ -0,0 +1,32 @@
+# units.py
+# Conversions from the NetCDF (SI) units to the units shown on the dashboard
+
+# Station clock is UTC-4 (AST, no daylight saving); every local time ("Hora",
+# captions, local days, export ranges) is UTC shifted by this many hours
+UTC_OFFSET_HOURS = -4
+
+# variable: (scale, offset, display unit)
+DISPLAY_UNITS = {
+    "air_temperature": (1.8, 32, "°F"),
+    "wind_avg": (1.94384, 0, "kts"),
+    "wind_gust": (1.94384, 0, "kts"),
+    "wind_lull": (1.94384, 0, "kts"),
+    "rain_accumulated": (0.0393701, 0, "in"),
+    "lightning_strike_avg_distance": (0.621371, 0, "mi"),
+}
+
+
+def to_display(values, var):
+    """Convert a scalar/array/Series of `var` to its dashboard unit."""
+    if var not in DISPLAY_UNITS:
+        return values
+    scale, offset, _ = DISPLAY_UNITS[var]
+    return values * scale + offset
+
+
+def convert_frame(df, variables=None):
+    """Convert the columns of `df` in place and return it."""
+    for var in variables or DISPLAY_UNITS:
+        if var in df.columns:
+            df[var] = to_display(df[var], var)
+    return df
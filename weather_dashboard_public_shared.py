@@ -33,6 +33,18 @@ from rasterio.windows import from_bounds
 import tempfile
 import io, base64, time, re
 from PIL import Image, ImageDraw, ImageFont
+from running_stats import StationStats
+from units import UTC_OFFSET_HOURS, convert_frame, to_display
+from climatology import CLIMATOLOGY_FILE, load_climatology, normal_band
+from export import EXPORT_FORMATS, export_to_file, export_variables
+from timeseries_store import TimeSeriesStore, format_time
+from qc import QC_PENDING_ROWS
+from lightning_alerts import LightningMonitor
+from radar_point import STATION_LAT, STATION_LON, station_reflectivity
+from radar import DBZ_MIN, colorize
+from storm_motion import NOWCAST_MIN, StormTracker
+from radar_loop import LOOP_URL, RadarLoop
+import fetcher
 
 
 # -----------------------------
@@ -123,38 +135,78 @@ st.caption("Los datos meteorológicos recopilados por la estación Tempest se pr
 # -----------------------------
 # LOAD DATA
 # -----------------------------
-@st.cache_data(ttl=60)
-def load_weather_data(nc_file):
-    ds = xr.open_dataset(nc_file, decode_timedelta=True)
-    df = ds.to_dataframe().reset_index()
+@st.cache_resource(ttl=60)
+def load_weather_store(nc_file):
+    # One shared float32/int64 store per process instead of a pickled frame per session.
+    # Quality control: keep the flags, hide flagged values from charts and metrics
+    return TimeSeriesStore.from_netcdf(nc_file).apply_qc()
 
-    if "time" in df.columns:
-        df["Hora"] = pd.to_datetime(df["time"]) - pd.Timedelta(hours=4)
-        df["timestamp_ampm"] = df["Hora"].dt.strftime("%I:%M %p")
+# -----------------------------
+# REMOTE SOURCES
+# -----------------------------
+@st.cache_resource
+def start_fetcher():
+    # Downloads run on their own event loop; page reruns only read local files
+    if fetcher.RADAR_INDEX_URL or fetcher.STATION_DATA_URL:
+        return fetcher.start_background()
+    return None
 
-    return df.sort_values("Hora")
+start_fetcher()
 
 # -----------------------------
 # FILE PATH
 # -----------------------------
 DATA_FILE = "weather_data.nc"
-df = load_weather_data(DATA_FILE)
+store = load_weather_store(DATA_FILE)
+df = store.to_frame(include_flags=False)
+
+# -----------------------------
+# LIGHTNING ALERTS
+# -----------------------------
+@st.cache_resource
+def get_lightning_monitor():
+    # One background evaluator per server process, independent of page reruns
+    monitor = LightningMonitor(DATA_FILE)
+    monitor.start()
+    return monitor
+
+lightning_monitor = get_lightning_monitor()
+lightning_alert = lightning_monitor.active_alert()
+if lightning_alert is not None and lightning_alert.kind != "all_clear":
+    st.error(f"⚡ ALERTA DE RAYOS: {lightning_alert.message}. Salga del agua y busque refugio.")
+if not lightning_monitor.healthy():
+    st.warning("⚠️ El monitor de rayos no está funcionando; las alertas pueden no aparecer.")
 
 # -----------------------------
 # ADJUSTING
 # -----------------------------
-df["air_temperature"] = df["air_temperature"] * 1.8 + 32
-df["wind_avg"] = df["wind_avg"] * 1.94384
-df["wind_gust"] = df["wind_gust"] * 1.94384
-df["wind_lull"] = df["wind_lull"] * 1.94384
-df["rain_accumulated"] = df["rain_accumulated"] * 0.0393701
-df["lightning_strike_avg_distance"] = df["lightning_strike_avg_distance"] * 0.621371
+df = convert_frame(df)
+
+# -----------------------------
+# RUNNING STATISTICS
+# -----------------------------
+STATS_FILE = "running_stats.json"
+
+@st.cache_resource
+def get_running_stats():
+    return StationStats.load(STATS_FILE)
+
+stats = get_running_stats()
+with stats.lock:
+    # Only rows newer than the last persisted observation are pushed; the newest
+    # row waits for its successor so a spike can't be baked into the daily max/min.
+    # Flat-line flags arrive later than that, so the start of a stuck run that was
+    # already pushed stays in the statistics (see QC_PENDING_ROWS)
+    if stats.update_frame(df.iloc[:len(df) - QC_PENDING_ROWS]):
+        stats.save(STATS_FILE)
 
 # -----------------------------
 # CURRENT CONDITIONS
 # -----------------------------
 
 def wind_direction_cardinal(degrees):
+    if np.isnan(degrees):
+        return "—"
     dirs = ["N", "NE", "E", "SE", "S", "SO", "O", "NO"]
     ix = int((degrees + 22.5) // 45) % 8
     return dirs[ix]
@@ -164,7 +216,13 @@ st.markdown(
     "<h3 style='color:#1f77b4;'>Datos en Tiempo Real</h3>",
     unsafe_allow_html=True
 )
-latest = df.iloc[-1]
+# Last good reading of each variable (QC-flagged, missing or stale values are NaN)
+latest_time, latest_values = store.latest()
+latest = pd.Series({var: to_display(v, var) for var, v in latest_values.items()})
+
+def metric_value(value, fmt, unit=""):
+    """Formatted reading, or a dash when there is no current value."""
+    return "—" if np.isnan(value) else f"{value:{fmt}}{unit}"
 
 # -----------------------------
 # UV Ranges
@@ -173,7 +231,11 @@ latest = df.iloc[-1]
 uv_index = latest.uv  # Replace with actual UV index value
 
 # Define color based on UV index
-if latest.uv <= 2:
+if np.isnan(latest.uv):
+    color = "gray"
+    background_color = "#e2e3e5"  # Light gray background
+    description = "Sin datos"
+elif latest.uv <= 2:
     color = "green"
     background_color = "#d4edda"  # Light green background
     description = "Riesgo: Bajo"
@@ -195,24 +257,25 @@ else:
     description = "Riesgo: Extremo"
 
 
-st.caption(f"🕒 Última observación: {latest.timestamp_ampm}")
+st.caption(f"🕒 Última observación: {format_time(latest_time)}")
 
 c1, c2, c3, c4, c5, c6 = st.columns(6)
-c1.metric("🌬️ Velocidad del Viento", f"{latest.wind_avg:.1f} kts")
-c2.metric("🌬️ Ráfagas", f"{latest.wind_gust:.1f} kts")
+c1.metric("🌬️ Velocidad del Viento", metric_value(latest.wind_avg, ".1f", " kts"))
+c2.metric("🌬️ Ráfagas", metric_value(latest.wind_gust, ".1f", " kts"))
 
 #c2.metric("🧭 Dirección del Viento (º)",f"Del {wind_direction_cardinal(latest.wind_direction)}\n({latest.wind_direction:.0f}°)")
-c3.metric("🧭 Dirección del Viento",f"Del {wind_direction_cardinal(latest.wind_direction)}")
-c4.metric("🌡️ Temperatura", f"{latest.air_temperature:.1f} °F")
-c5.metric("💧 Humedad", f"{latest.relative_humidity:.0f}%")
+c3.metric("🧭 Dirección del Viento",
+          "—" if np.isnan(latest.wind_direction) else f"Del {wind_direction_cardinal(latest.wind_direction)}")
+c4.metric("🌡️ Temperatura", metric_value(latest.air_temperature, ".1f", " °F"))
+c5.metric("💧 Humedad", metric_value(latest.relative_humidity, ".0f", "%"))
 # Display the metric using c5
-c6.metric("☀️ Índice UV", f"{latest.uv:.1f}")
+c6.metric("☀️ Índice UV", metric_value(latest.uv, ".1f"))
 
 with c3:
     st.markdown(
         f"""
         <div style=" font-size: 1.5rem; margin-top: -30px; padding: 0;">
-            ({latest.wind_direction:.0f}°)
+            ({metric_value(latest.wind_direction, ".0f", "°")})
         </div>
         """,
         unsafe_allow_html=True
@@ -221,6 +284,23 @@ with c3:
 with c6:
    st.markdown(f"<h3 style='color:{color}; font-size: 1rem; margin-top: -30px; padding: 0;'> {description}</h3>", unsafe_allow_html=True)
 
+# -----------------------------
+# Daily Summary
+# -----------------------------
+now_epoch = latest_time
+with stats.lock:
+    gust_day = stats.summary("wind_gust", "day", now_epoch)
+    temp_day = stats.summary("air_temperature", "day", now_epoch)
+    rain_24h = stats.summary("rain_accumulated", "24h", now_epoch)
+    uv_day = stats.summary("uv", "day", now_epoch)
+
+d1, d2, d3, d4, d5 = st.columns(5)
+d1.metric("🌬️ Ráfaga Máxima Hoy", f"{gust_day['max']:.1f} kts")
+d2.metric("🌡️ Temp. Mínima Hoy", f"{temp_day['min']:.1f} °F")
+d3.metric("🌡️ Temp. Máxima Hoy", f"{temp_day['max']:.1f} °F")
+d4.metric("🌧️ Lluvia 24 h", f"{rain_24h['sum']:.2f}\"")
+d5.metric("☀️ UV Máximo Hoy", f"{uv_day['max']:.1f}")
+
 st.markdown(
     """
     <style>
@@ -244,6 +324,73 @@ st.markdown(
 ## ----------------------------------------
 #################################################################################
 
+@st.cache_resource
+def get_storm_tracker():
+    return StormTracker()
+
+tracker = get_storm_tracker()
+with tracker.lock:
+    # Only frames that arrived since the last rerun are read and correlated
+    tracker.update()
+    radar_latest = tracker.dbz
+    radar_bounds = tracker.latlon
+    radar_time = tracker.time
+    radar_nowcast = tracker.nowcast(NOWCAST_MIN)
+    storm_speed, storm_heading = tracker.mean_motion()
+    station_nowcast = (
+        tracker.value_at(radar_nowcast, STATION_LON, STATION_LAT)
+        if radar_nowcast is not None else np.nan
+    )
+
+@st.cache_resource
+def get_radar_loop():
+    return RadarLoop()
+
+radar_loop = get_radar_loop()
+with radar_loop.lock:
+    # Appends only new frames, then re-encodes static/radar_loop.webp
+    radar_loop.update()
+
+if radar_latest is not None:
+    st.markdown(
+        "<h3 style='color:#1f77b4;'>Radar</h3>",
+        unsafe_allow_html=True
+    )
+    radar_hora = radar_time + pd.Timedelta(hours=UTC_OFFSET_HOURS)
+    st.caption(f"🕒 Imagen de radar: {radar_hora.strftime('%I:%M %p')}")
+
+    if not np.isnan(storm_speed):
+        r1, r2 = st.columns(2)
+        r1.metric("🌧️ Movimiento de Tormentas", f"{storm_speed:.0f} km/h hacia el {wind_direction_cardinal(storm_heading)}")
+        if np.isnan(station_nowcast) or station_nowcast < DBZ_MIN:
+            r2.metric(f"📍 Pronóstico {NOWCAST_MIN} min en la estación", "Sin lluvia")
+        else:
+            r2.metric(f"📍 Pronóstico {NOWCAST_MIN} min en la estación", f"{station_nowcast:.0f} dBZ")
+
+    west, south, east, north = radar_bounds
+    radar_map = folium.Map(location=[STATION_LAT, STATION_LON], zoom_start=8, tiles="CartoDB positron")
+    # One pre-encoded animation served from /app/static, cached by the browser per frame;
+    # its frames are already in Web Mercator, like the nowcast with mercator_project.
+    # folium would open a relative URL as a local file, so the url is set afterwards
+    loop_overlay = ImageOverlay(image="data:,", bounds=[[south, west], [north, east]],
+                                name="Radar (animación)")
+    loop_overlay.url = f"{LOOP_URL}?v={radar_loop.version}"
+    loop_overlay.add_to(radar_map)
+    if radar_nowcast is not None:
+        ImageOverlay(
+            image=colorize(radar_nowcast, alpha=120),
+            bounds=[[south, west], [north, east]],
+            mercator_project=True,
+            name=f"Pronóstico +{NOWCAST_MIN} min",
+            show=False,
+        ).add_to(radar_map)
+    folium.Marker(
+        [STATION_LAT, STATION_LON],
+        tooltip="Balneario Punta Salinas",
+    ).add_to(radar_map)
+    folium.LayerControl().add_to(radar_map)
+    st_folium(radar_map, height=450, use_container_width=True, returned_objects=[])
+
 #################################################################################
 # -----------------------------
 # PLOTS
@@ -263,6 +410,35 @@ meses = ["enero","febrero","marzo","abril","mayo","junio",
 tick_labels = [f"{t.day}-{meses[t.month-1]}-{t.year}<br>{t.strftime('%I:%M %p')}" for t in ticks]
 tick_labels = [f"{t.day}/{meses[t.month-1]}<br>{t.strftime('%I:%M %p')}" for t in ticks]
 
+# -----------------------------
+# Climatology (normal band)
+# -----------------------------
+@st.cache_resource(max_entries=1)
+def get_climatology(mtime):
+    # Built offline by `python climatology.py weather_data.nc`; keyed on the
+    # file's mtime so the first build and nightly rebuilds are picked up
+    if mtime is None:
+        return None
+    return load_climatology(CLIMATOLOGY_FILE)
+
+clim_mtime = os.path.getmtime(CLIMATOLOGY_FILE) if os.path.exists(CLIMATOLOGY_FILE) else None
+clim = get_climatology(clim_mtime)
+band = None
+if clim is not None:
+    band = normal_band(clim, end_date - pd.Timedelta(hours=23), hours=25)
+
+def normal_band_traces(band, var, color="rgba(61,177,227,0.15)"):
+    lo = to_display(band[f"{var}_p10"], var)
+    hi = to_display(band[f"{var}_p90"], var)
+    return [
+        go.Scatter(x=band.index, y=lo, mode="lines", line=dict(width=0),
+                   hoverinfo="skip", showlegend=False),
+        go.Scatter(x=band.index, y=hi, mode="lines", line=dict(width=0),
+                   fill="tonexty", fillcolor=color, hoverinfo="skip", name="Normal (p10–p90)"),
+        go.Scatter(x=band.index, y=to_display(band[f"{var}_p50"], var), mode="lines",
+                   line=dict(color="gray", width=1, dash="dot"), hoverinfo="skip", name="Normal"),
+    ]
+
 
 st.subheader("")
 st.markdown(
@@ -521,6 +697,8 @@ fig = go.Figure()  # empty figure
 fig.add_trace(line_gust)
 fig.add_trace(line_avg)
 fig.add_trace(scatter)  # arro
+if band is not None:
+    fig.add_traces(normal_band_traces(band, "wind_avg"))
 #fig = go.Figure(data=[scatter])
 
 
@@ -606,6 +784,9 @@ fig.update_traces(
     hovertemplate="Temperatura: %{y:.1f}°F<extra></extra>",
 )
 
+if band is not None:
+    fig.add_traces(normal_band_traces(band, "air_temperature"))
+
 
 # Layout
 fig.update_layout(
@@ -682,6 +863,10 @@ fig.update_traces(
 
 ymax = df["rain_accumulated"].max()
 
+if band is not None:
+    rain_normal = to_display(band["rain_accumulated_mean"].iloc[:24].sum(), "rain_accumulated")
+    st.caption(f"🌧️ Lluvia últimas 24 h: {rain_24h['sum']:.2f}\" • Normal para esta fecha: {rain_normal:.2f}\"")
+
 # Layout
 fig.update_layout(
     hovermode="x unified",
@@ -723,6 +908,28 @@ fig.update_layout(
         font=dict(color="black")  # make legend text black
     )
 )
+
+# Radar reflectivity at the station on a secondary axis
+@st.cache_data(ttl=120)
+def load_station_reflectivity():
+    return station_reflectivity()
+
+refl = load_station_reflectivity()
+if not refl.empty:
+    fig.add_trace(go.Scatter(
+        x=refl["Hora"],
+        y=refl["bref_max"],
+        mode="lines+markers",
+        line=dict(color="#7b3294", width=2),
+        yaxis="y2",
+        name="Reflectividad (dBZ)",
+        hovertemplate="Reflectividad: %{y:.0f} dBZ<extra></extra>",
+    ))
+    fig.update_layout(
+        yaxis2=dict(title="Reflectividad (dBZ)", overlaying="y", side="right", range=[0, 70], showgrid=False),
+        showlegend=True,
+        legend=dict(x=0.01, y=0.95, xanchor="left", yanchor="top", orientation="h"),
+    )
 st.plotly_chart(fig, width="stretch")
 
 #################################################################################
@@ -788,6 +995,8 @@ st.plotly_chart(fig, width="stretch")
 ## ----------------------------------------
 #################################################################################
 
+alert_radius_mi = to_display(lightning_monitor.config.radius_km, "lightning_strike_avg_distance")
+
 fig = px.line(df, x="Hora", y="lightning_strike_avg_distance", title="Distancia del Rayo",labels={"lightning_strike_avg_distance": "Distancia del Rayo (mi)"})
 
 fig.update_traces(
@@ -810,11 +1019,17 @@ fig.update_layout(
     ),
     yaxis=dict(
         title="Distancia del Rayo (mi)",
-        range=[0, 6]   # y-axis min/max
+        range=[0, max(6, alert_radius_mi * 1.25)]   # y-axis min/max, alert radius always visible
     ),
     showlegend=False
 )
 
+# Alert radius
+fig.add_hline(
+    y=alert_radius_mi,
+    line=dict(color="#e3351e", width=1, dash="dash"),
+)
+
 
 fig.update_layout(
     paper_bgcolor="white",   # entire chart background
@@ -841,6 +1056,53 @@ fig.update_layout(
 )
 st.plotly_chart(fig, width="stretch")
 
+#################################################################################
+## ----------------------------------------
+# Data Download
+## ----------------------------------------
+#################################################################################
+
+# The finished file is read into memory for st.download_button, so the dashboard
+# only serves bounded ranges; longer exports go through export.py
+EXPORT_MAX_DAYS = 31
+
+with st.expander("⬇️ Descargar Datos"):
+    with st.form("export_form"):
+        e1, e2 = st.columns(2)
+        export_start = e1.date_input("Desde", value=(end_date - pd.Timedelta(days=7)).date())
+        export_end = e2.date_input("Hasta", value=end_date.date())
+        export_vars = st.multiselect("Variables", export_variables(DATA_FILE))
+        export_fmt = st.selectbox("Formato", list(EXPORT_FORMATS), format_func=str.upper)
+        export_units = st.checkbox("Convertir a unidades del tablero (°F, nudos, pulgadas, millas)")
+        submitted = st.form_submit_button("Preparar descarga")
+
+    export_days = (export_end - export_start).days + 1
+    if submitted and export_days < 1:
+        st.error("La fecha final debe ser igual o posterior a la inicial.")
+    elif submitted and export_days > EXPORT_MAX_DAYS:
+        st.warning(f"El tablero exporta hasta {EXPORT_MAX_DAYS} días a la vez ({export_days} seleccionados). "
+                   "Para rangos más largos use `python export.py`.")
+    elif submitted:
+        # Local (UTC-4) calendar days to UTC
+        utc_start = pd.Timestamp(export_start) - pd.Timedelta(hours=UTC_OFFSET_HOURS)
+        utc_end = pd.Timestamp(export_end) + pd.Timedelta(days=1) - pd.Timedelta(hours=UTC_OFFSET_HOURS, seconds=1)
+        mime, ext = EXPORT_FORMATS[export_fmt]
+
+        # Written chunk by chunk to a private temp file; only the finished file is handed to Streamlit
+        fd, out_path = tempfile.mkstemp(prefix="ccan_export_", suffix=ext)
+        os.close(fd)
+        try:
+            with st.spinner("Preparando archivo..."):
+                export_to_file(out_path, DATA_FILE, export_fmt, start=utc_start, end=utc_end,
+                               variables=export_vars or None, convert_units=export_units)
+            with open(out_path, "rb") as f:
+                export_bytes = f.read()
+        finally:
+            os.remove(out_path)
+        st.download_button("Descargar", export_bytes, file_name=f"punta_salinas_{export_start}_{export_end}{ext}", mime=mime)
+    st.caption(f"Hasta {EXPORT_MAX_DAYS} días por descarga. Para exportaciones más largas use "
+               "`python export.py` directamente sobre el archivo NetCDF.")
+
 #################################################################################
 # -----------------------------
 # FOOTER